@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Benchmark the pick list generator on seeded synthetic data. Work orders, inventory and the swap list are
+# written as the CSV stand-ins and workbook the generator reads with --csv-dir and --swap-list, the generator
+# is run on them, and the wall time of each of its stages is reported as JSON.
+
+generator_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Pick List Generator.py")
+
+# Site IDs in the order synthetic sites are added; 5 and 2 come first so cross-site picking is exercised
+site_ids = ["5", "2", "1", "3", "4", "6", "7", "8", "9"]
+
+# Inventory location categories; the last one is dropped by the generator's inventory filter
+location_categories = ["CMF Warehouse", "CMF Warehouse - Cold", "W1", "W2", "W3", "W4", "Quarantine"]
+
+# Work orders: lines_per_work_order BOM lines per work order, spread over the sites and a month of schedule.
+# About substitute_rate of the primary lines are followed by an ORIG_CODE 'S' line for another item.
+def make_work_orders(rng, lines, items, sites, lines_per_work_order=10, substitute_rate=0.1):
+    work_order_count = max(1, lines // lines_per_work_order)
+    work_order_numbers = np.sort(rng.choice(np.arange(100000, 100000 + work_order_count * 10), work_order_count, replace=False))
+    work_order_of_line = np.sort(rng.integers(0, work_order_count, lines))
+    work_order_site = rng.choice(site_ids[:sites], work_order_count)
+    work_order_sched = pd.Timestamp("2025-03-01") + pd.to_timedelta(rng.integers(0, 30 * 24, work_order_count), unit="h")
+
+    orig_codes = np.where(rng.random(lines) < substitute_rate, "S", "O")
+    orig_codes[0] = "O"
+    # A substitute line covers the primary line before it, so it shares that line's sequence number
+    seq_nums = pd.Series(orig_codes == "O").groupby(work_order_of_line).cumsum().to_numpy()
+
+    work_orders = pd.DataFrame({
+        "WORKORDER_ID": [f"{number:08d}" for number in work_order_numbers[work_order_of_line]],
+        "PROJECT_NUMBER": [f"P{number % 97:03d}" for number in work_order_numbers[work_order_of_line]],
+        "PROD_BATCH_NUM": [f"B{number % 311:04d}" for number in work_order_numbers[work_order_of_line]],
+        "PROD_ITEMID": [f"BR-{number % 53}" for number in work_order_numbers[work_order_of_line]],
+        "ORIG_CODE": orig_codes,
+        "CUSTOM_DATA1": rng.choice(["Downstream", "Upstream", "Fill"], lines),
+        "BOM_CUSTOM_DATA1": rng.choice(["", "Replenishment"], lines),
+        "COMP_ITEMID": rng.integers(100000, 100000 + items, lines).astype(str),
+        "QTY": rng.choice([1.0, 2.0, 3.0, 7.5, 15.0, 40.0], lines),
+        "SITE_ID": work_order_site[work_order_of_line],
+        "SCHED_DATETIME": work_order_sched[work_order_of_line].strftime("%Y-%m-%d %H:%M:%S"),
+        "SEQ_NUM": seq_nums,
+    })
+    return work_orders
+
+# Inventory: lots_per_item lots of every item over the sites, stocked to cover the item's demand,
+# except for about shortage_rate of the items, which are stocked short
+def make_inventory(rng, work_orders, items, lots_per_item, sites, shortage_rate):
+    item_ids = np.arange(100000, 100000 + items)
+    demand = work_orders.groupby(work_orders["COMP_ITEMID"].astype(int))["QTY"].sum().reindex(item_ids, fill_value=0).to_numpy()
+    cover = np.where(rng.random(items) < shortage_rate, rng.uniform(0.2, 0.9, items), rng.uniform(1.1, 2.0, items))
+    stock = np.maximum(demand * cover, 1.0)
+
+    lot_items = np.repeat(item_ids, lots_per_item)
+    lot_shares = rng.dirichlet(np.ones(lots_per_item), items).ravel()
+    lot_count = len(lot_items)
+
+    inventory = pd.DataFrame({
+        "SITE_ID": rng.choice(site_ids[:sites], lot_count),
+        "ITEM_ID": lot_items.astype(str),
+        "LOTID": [f"L{lot:08d}" for lot in range(lot_count)],
+        "LOC_ID": rng.choice(["11-12-C", "12-29-B", "03-01-A", "COLD-2"], lot_count),
+        "EXPDATE": (pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 900, lot_count), unit="D")).strftime("%Y-%m-%d"),
+        "QTYTOTAL": np.round(np.repeat(stock, lots_per_item) * lot_shares, 3),
+        "ITEMDESC": [f"Item {item}" for item in lot_items],
+        "STOCK_UOM": rng.choice(["EA", "ML", "G"], lot_count),
+        "CUSTOM_DATA1": rng.choice(location_categories, lot_count, p=[0.3, 0.1, 0.15, 0.15, 0.1, 0.1, 0.1]),
+        "BOM_CUSTOM_DATA1": rng.choice(["", "Replenishment", "MFG Only"], lot_count, p=[0.6, 0.35, 0.05]),
+    })
+    return inventory
+
+# Swap list: override_density overrides per primary line, at a random swap level, for keys and items
+# taken from the work orders so that they match
+def make_overrides(rng, work_orders, items, override_density):
+    primary_lines = work_orders[work_orders["ORIG_CODE"] == "O"]
+    count = int(round(len(primary_lines) * override_density))
+    lines = primary_lines.iloc[rng.integers(0, len(primary_lines), count)] if count else primary_lines.iloc[:0]
+
+    overrides = pd.DataFrame({
+        "Swap Level": rng.choice(["Work Order", "Batch", "Project"], count),
+        "Work Order ID": lines["WORKORDER_ID"].to_numpy(),
+        "Production Batch Number": lines["PROD_BATCH_NUM"].to_numpy(),
+        "Project Number": lines["PROJECT_NUMBER"].to_numpy(),
+        "Original KBI Item Number": lines["COMP_ITEMID"].astype(int).to_numpy(),
+        "Substitute KBI Item Number": rng.integers(100000, 100000 + items, count),
+    })
+    return overrides
+
+# Write a seeded data set where the generator expects it: <query name>.csv files and a swap list workbook
+def write_data_set(folder, lines, items, lots_per_item, sites, override_density, shortage_rate, seed):
+    rng = np.random.default_rng(seed)
+    work_orders = make_work_orders(rng, lines, items, sites)
+    inventory = make_inventory(rng, work_orders, items, lots_per_item, sites, shortage_rate)
+    overrides = make_overrides(rng, work_orders, items, override_density)
+
+    work_orders.to_csv(os.path.join(folder, "work_orders_query.csv"), index=False)
+    inventory.to_csv(os.path.join(folder, "inventory_query.csv"), index=False)
+    swap_list = os.path.join(folder, "Planners WO BOM Swaps List.xlsx")
+    overrides.to_excel(swap_list, index=False)
+    return swap_list, {"work_orders": len(work_orders), "inventory": len(inventory), "overrides": len(overrides)}
+
+# Run the generator once on a data set; returns its stage timings and total wall time
+def run_generator(folder, swap_list, xlsx):
+    output_dir = tempfile.mkdtemp(dir=folder)
+    timings_file = os.path.join(output_dir, "timings.json")
+    command = [sys.executable, generator_script, "--csv-dir", folder, "--swap-list", swap_list,
+               "--pick-list", os.path.join(output_dir, "Pick List.xlsx"), "--timings", timings_file,
+               "--xlsx" if xlsx else "--no-xlsx"]
+
+    started = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    total = time.perf_counter() - started
+
+    with open(timings_file, "r") as file:
+        timings = json.load(file)
+    timings["total"] = total
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pick list generator on seeded synthetic data.")
+    parser.add_argument("--lines", type=int, default=20000, help="work order BOM lines")
+    parser.add_argument("--items", type=int, default=2000, help="distinct component items")
+    parser.add_argument("--lots-per-item", type=int, default=8, help="inventory lots per item")
+    parser.add_argument("--sites", type=int, default=3, help=f"sites, up to {len(site_ids)}")
+    parser.add_argument("--override-density", type=float, default=0.02, help="swap list overrides per primary line")
+    parser.add_argument("--shortage-rate", type=float, default=0.1, help="share of items stocked below their demand")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the data set")
+    parser.add_argument("--repeat", type=int, default=3, help="generator runs on the data set")
+    parser.add_argument("--xlsx", action=argparse.BooleanOptionalAction, default=True,
+                        help="include the Pick List.xlsx export in the output stage")
+    parser.add_argument("-o", "--output", help="JSON file to write the results to (default: stdout)")
+    args = parser.parse_args()
+
+    if not 1 <= args.sites <= len(site_ids):
+        parser.error(f"--sites must be between 1 and {len(site_ids)}")
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    parameters = {name: getattr(args, name) for name in
+                  ("lines", "items", "lots_per_item", "sites", "override_density", "shortage_rate", "seed", "xlsx")}
+
+    started = pd.Timestamp.now().isoformat(timespec="seconds")
+    with tempfile.TemporaryDirectory() as folder:
+        swap_list, row_counts = write_data_set(folder, args.lines, args.items, args.lots_per_item, args.sites,
+                                               args.override_density, args.shortage_rate, args.seed)
+        runs = [run_generator(folder, swap_list, args.xlsx) for _ in range(args.repeat)]
+
+    results = {
+        "parameters": parameters,
+        "rows": row_counts,
+        "runs": runs,
+        "median": {stage: statistics.median(run[stage] for run in runs) for stage in runs[0]},
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "started": started,
+    }
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
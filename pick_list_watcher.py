@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+from collections import namedtuple
+
+import pandas as pd
+import pyarrow as pa
+
+from pick_tickets import published_pick_list, read_pick_list, read_rollup, shortage_rollup_file, status_rollup_file
+from work_order_search import WorkOrderSearch
+
+# One loaded version of the published pick list with everything the navigator serves from it: the pick list
+# indexed by (Target Site ID, Work Order ID), its search index and the rollups by site. `version` identifies the
+# published files.
+PickListVersion = namedtuple('PickListVersion', [
+    'path', 'version', 'generated', 'loaded', 'pick_list', 'work_orders_by_site', 'rows_by_work_order', 'search',
+    'rollups_by_site',
+])
+
+# Identity of a set of published files: it changes whenever the generator moves a new one into place
+def file_version(*paths):
+    identities = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            identities.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        else:
+            identities.append(f"{path}:-")
+    return hashlib.sha1("|".join(identities).encode()).hexdigest()[:8]
+
+# When the pick list was generated: the stamp in the Arrow file's metadata, or else the file's modification time
+def generated_time(path):
+    if path.endswith(".arrow"):
+        metadata = pa.ipc.open_file(pa.memory_map(path)).schema.metadata or {}
+        if b'generated' in metadata:
+            return pd.Timestamp(metadata[b'generated'].decode())
+    return pd.Timestamp.fromtimestamp(os.path.getmtime(path))
+
+# The shortage and status rollups published with the pick list generated at generated, split by Target Site ID
+# so a site's views are served as is. Empty until the generator has published both for that pick list.
+def load_rollups(generated):
+    status, shortages = read_rollup(status_rollup_file, generated), read_rollup(shortage_rollup_file, generated)
+    if status is None or shortages is None:
+        return {}
+    shortages_by_site = dict(tuple(shortages.groupby("Target Site ID", sort=False)))
+    rollups_by_site = {}
+    for site, rows in status.groupby("Target Site ID", sort=False):
+        site_shortages = shortages_by_site.get(site, shortages.iloc[:0])
+        rollups_by_site[site] = (rows.drop(columns="Target Site ID"), site_shortages.drop(columns="Target Site ID"))
+    return rollups_by_site
+
+# Load and index the published pick list and its rollups, reusing the previous version's pick list when only the
+# rollups are new. Returns None if a new file was published while they were being read.
+def load_version(path, previous=None):
+    files = (path, status_rollup_file, shortage_rollup_file)
+    version = file_version(*files)
+    generated = generated_time(path)
+    rollups_by_site = load_rollups(generated)
+    if previous is not None and previous.path == path and previous.generated == generated:
+        if file_version(*files) != version:
+            return None
+        return previous._replace(version=version, loaded=pd.Timestamp.now(), rollups_by_site=rollups_by_site)
+
+    pick_list = read_pick_list(path)
+    if file_version(*files) != version:
+        return None
+
+    work_orders_by_site = {}
+    rows_by_work_order = {}
+    for (site, work_order), rows in pick_list.groupby(["Target Site ID", "Work Order ID"], sort=False):
+        work_orders_by_site.setdefault(site, []).append(work_order)
+        rows_by_work_order[(site, work_order)] = rows
+    return PickListVersion(path, version, generated, pd.Timestamp.now(), pick_list, work_orders_by_site,
+                           rows_by_work_order, WorkOrderSearch(pick_list), rollups_by_site)
+
+# Watches the published pick list and rollups and loads each new version of them once, in a background thread,
+# so no session waits on a reload and the whole set switches together. `current` is swapped to a new version
+# only once it is fully loaded; a rerun that started on the previous one keeps it until the rerun ends.
+class PickListWatcher:
+    def __init__(self, interval=5):
+        self.interval = interval
+        self.current = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # Load the published version if it is new; returns whether current changed
+    def refresh(self):
+        path = published_pick_list()
+        current = self.current
+        if (current is not None and current.path == path and
+                current.version == file_version(path, status_rollup_file, shortage_rollup_file)):
+            return False
+        loaded = load_version(path, current)
+        if loaded is None:
+            return False
+
+        # Swapping the reference is atomic, so readers see the old version or the new one whole
+        self.current = loaded
+        return True
+
+    # Load the published version now, then poll for new ones every interval seconds. Raises if there is no
+    # published pick list or it cannot be read, rather than waiting for one.
+    def start(self, attempts=3):
+        # A version replaced while it was being read is read again
+        for _ in range(attempts):
+            if self.refresh():
+                break
+        else:
+            raise RuntimeError(f"{published_pick_list()} kept changing while it was being loaded")
+        self.thread = threading.Thread(target=self.watch, name="pick-list-watcher", daemon=True)
+        self.thread.start()
+        return self
+
+    # A version that fails to load is logged and tried again next interval; the current one stays in use
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Could not load {published_pick_list()}: {e!r}")
+
+    def stop(self):
+        self.stopped.set()
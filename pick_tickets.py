@@ -0,0 +1,282 @@
+import argparse
+import copy
+import io
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+import pyarrow.feather as feather
+from fontTools import ttLib
+from fpdf import FPDF
+
+# Published pick list: the generator's typed Arrow file, or its Excel export
+pick_list_arrow_file = "/workspaces/picklistapp/Pick List.arrow"
+pick_list_xlsx_file = "/workspaces/picklistapp/Pick List.xlsx"
+
+# Shortage and status rollups the generator publishes next to the pick list
+shortage_rollup_file = "/workspaces/picklistapp/Pick List Shortages.arrow"
+status_rollup_file = "/workspaces/picklistapp/Pick List Status.arrow"
+
+# Folder holding the DejaVu TTF files
+font_dir = "/workspaces/picklistapp"
+
+site_texts = {
+    "1": "Boulder",
+    "2": "Hamlin",
+    "5": "CMF",
+}
+
+# Prefer the memory-mapped Arrow file when it has been published
+def published_pick_list():
+    return pick_list_arrow_file if os.path.exists(pick_list_arrow_file) else pick_list_xlsx_file
+
+# Read a published pick list with IDs as strings and expiration dates formatted for display
+def read_pick_list(path):
+    if path.endswith(".arrow"):
+        pick_list = feather.read_table(path, memory_map=True).to_pandas()
+    else:
+        pick_list = pd.read_excel(path)
+        pick_list["Work Order ID"] = pick_list["Work Order ID"].astype(str).str.zfill(8)
+    pick_list["Target Site ID"] = pick_list["Target Site ID"].astype(str)
+    pick_list["Expiration Date"] = pick_list["Expiration Date"].dt.strftime("%m-%d-%Y").fillna("")
+    return pick_list
+
+# Read a published rollup, memory-mapped; None unless the generator has published it with the pick list
+# generated at generated
+def read_rollup(path, generated):
+    if not os.path.exists(path):
+        return None
+    table = feather.read_table(path, memory_map=True)
+    stamp = (table.schema.metadata or {}).get(b'generated')
+    if stamp is None or pd.Timestamp(stamp.decode()) != generated:
+        return None
+    return table.to_pandas()
+
+# Blank document with the Unicode font (DejaVu) registered. Parsing the TTF files is the slow part
+# of building a PDF, so it is done once per process and every pick ticket starts from a copy.
+@lru_cache(maxsize=None)
+def pdf_template():
+    pdf = FPDF()
+    pdf.add_font('DejaVu', '', os.path.join(font_dir, 'DejaVuSans.ttf'), uni=True)
+    pdf.add_font('DejaVu', 'B', os.path.join(font_dir, 'DejaVuSans-Bold.ttf'), uni=True)
+    return pdf
+
+# A blank document copied from the template. Copies share each font's fontTools object, which output()
+# subsets in place, so a later ticket would miss the glyphs an earlier one did not use; each document gets its
+# own, opened lazily from the file the way add_font opens it.
+def new_document():
+    pdf = copy.deepcopy(pdf_template())
+    for font in pdf.fonts.values():
+        font.ttfont = ttLib.TTFont(font.ttffile, recalcTimestamp=False, lazy=True)
+    return pdf
+
+# Render the pick ticket for one work order as PDF bytes
+def generate_pdf(site_text, work_order_id, filtered_pick_list):
+    pdf = new_document()
+    pdf.set_font('DejaVu', '', 10)
+
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # Main Title Section
+    pdf.set_font("Arial", 'B', 14)
+
+    pdf.cell(0, 12, f"KBI Biopharma - {site_text}", ln=True, align='C', fill=False, border=1)
+
+    # Title Section
+    pdf.set_font("Arial", 'B', 12)
+    pdf.set_fill_color(235, 235, 235)  # Light blue background
+    pdf.cell(0, 12, f"Work Order ID: {work_order_id}", ln=True, align='C', fill=True, border = 1)
+    pdf.ln(8)
+
+    # Work Order Information - Two Column Layout
+    pdf.set_font("DejaVu", size=10)
+
+    # Left Column
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "Project ID:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Project Number']}", border=0)
+
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "Production Item ID:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Production ID']}", ln=True)
+
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "Batch:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Batch ID']}", border=0)
+
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "Scheduled Date:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Scheduled Date']}", ln=True)
+
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "Custom Data:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Custom Data']}", ln=True)
+
+    pdf.set_font("Arial", style='B', size=10)
+    pdf.cell(45, 8, "BoM Custom Data:", border=0)
+    pdf.set_font("DejaVu", size=10)
+    pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['BoM Custom Data']}", ln=True)
+
+    pdf.ln(10)
+
+    # Pick List Header
+    pdf.set_font("Arial", 'B', 12)
+    pdf.cell(0, 10, "Pick List", ln=True, align='C', fill=True, border=1)
+    pdf.ln(4)
+
+    # Table Formatting
+    pdf.set_font("DejaVu", 'B', 10)
+
+    # Group rows by ITEM_ID
+    grouped_data = defaultdict(list)
+    for _, row in filtered_pick_list.iterrows():
+        item_id = row["Item ID"]
+        grouped_data[item_id].append(row)
+
+    # Start processing each item group
+    for item_id, item_rows in grouped_data.items():
+        # Extract item-specific details for the header
+        total_qty_to_pick = str(item_rows[0]["Total Qty to Pick"])
+        stock_uom = str(item_rows[0]["Stock UoM"])
+        item_description = str(item_rows[0]["Item Description"])
+        item_orig_status = str(item_rows[0]['Original/Substitute'])
+        allocation_status = str(item_rows[-1]["Allocation Status"])
+
+        # Display the item-specific details as headers, each on a new line
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"Item ID: ", border=0, ln=False)  # Set width and avoid line break
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{item_id}", ln=False)  # Add line break after value
+        pdf.ln(5)
+
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"O/S: ", border=0, ln=False)
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{item_orig_status}", ln=False)  # Add line break after value
+        pdf.ln(5)
+
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"Total Qty to Pick: ", border=0, ln=False)
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{total_qty_to_pick}", ln=False)  # Add line break after value
+        pdf.ln(5)
+
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"Stock UoM: ", border=0, ln=False)
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{stock_uom}", ln=False)  # Add line break after value
+        pdf.ln(5)
+
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"Item Description: ", border=0, ln=False)
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{item_description}", ln=False)  # Add line break after value
+        pdf.ln(5)
+
+        pdf.set_font("Arial", 'B', 10)  # Set bold for the name
+        pdf.cell(40, 10, f"Allocation Status: ", border=0, ln=False)
+        pdf.set_font("DejaVu", '', 10)  # Set normal for the value
+        pdf.cell(0, 10, f"{allocation_status}", ln=False)  # Add line break after value
+        pdf.ln(5)                       
+
+        pdf.ln(6)
+
+
+        # Create the sub-table headers (with two columns)
+        sub_table_headers = ["Location ID", "Lot Qty to Pick", "Lot ID", "Expiration Date"]
+        col_widths_sub = [15, 25, 25, 20]
+
+        # Print Sub-table Header (for location, lot qty, lot ID, expiration date) in two columns
+        pdf.set_font("Arial", '', 10)
+        pdf.cell(col_widths_sub[0] * 2, 10, sub_table_headers[0], border=1, align='C', fill=True)
+        pdf.cell(col_widths_sub[1] * 2, 10, sub_table_headers[1], border=1, align='C', fill=True)
+        pdf.cell(col_widths_sub[2] * 2, 10, sub_table_headers[2], border=1, align='C', fill=True)
+        pdf.cell(col_widths_sub[3] * 2, 10, sub_table_headers[3], border=1, align='C', fill=True)
+        pdf.ln(10)  # Move to the next row after headers
+
+        # Print each row in the sub-table for the current item
+        pdf.set_font("Arial", size=9)
+        for row in item_rows:
+            loc_id = str(row["Location ID"])
+            lot_qty_to_pick = str(row["Lot Qty to Pick"])
+            lotid = str(row["Lot ID"])
+            expiration_date = row["Expiration Date"]
+
+            # Print the data in the sub-table
+            pdf.cell(col_widths_sub[0] * 2, 10, loc_id, border=1, align='C')
+            pdf.cell(col_widths_sub[1] * 2, 10, lot_qty_to_pick, border=1, align='C')
+            pdf.cell(col_widths_sub[2] * 2, 10, lotid, border=1, align='C')
+            pdf.cell(col_widths_sub[3] * 2, 10, expiration_date, border=1, align='C')
+            pdf.ln(10)  # Move to the next row after this entry
+
+            # Ensure there's no overlap, check the Y position and add a page if needed
+            if pdf.get_y() > pdf.h - 40:  # 40 is a margin for the page bottom
+                pdf.add_page()
+
+        pdf.ln(10)  # Add some space between different items
+
+    # Render in memory; nothing is written to disk
+    return bytes(pdf.output())
+
+# Work orders for a Target Site ID scheduled between start and end (inclusive dates; None leaves that
+# side open), as (Work Order ID, rows) pairs in pick list order
+def select_work_orders(pick_list, site_id, start=None, end=None):
+    sched = pd.to_datetime(pick_list["Scheduled Date"])
+    mask = pick_list["Target Site ID"] == str(site_id)
+    if start is not None:
+        mask &= sched >= pd.Timestamp(start)
+    if end is not None:
+        mask &= sched < pd.Timestamp(end) + pd.Timedelta(days=1)
+    return list(pick_list[mask].groupby("Work Order ID", sort=False))
+
+# Worker entry point: one (site_text, work_order_id, rows) task to (work_order_id, PDF bytes)
+def render_ticket(task):
+    site_text, work_order_id, rows = task
+    return work_order_id, generate_pdf(site_text, work_order_id, rows)
+
+# Render the pick tickets of every selected work order across a process pool and return them as a
+# zip of WO_<id>.pdf files, plus the number of tickets. Each worker registers the fonts once. mp_context sets
+# how the workers are started; the default (fork on Linux) is only safe from a single-threaded process.
+def render_batch(pick_list, site_id, start=None, end=None, workers=None, mp_context=None):
+    site_text = site_texts.get(str(site_id), "KBI Biopharma")
+    tasks = [(site_text, work_order_id, rows)
+             for work_order_id, rows in select_work_orders(pick_list, site_id, start, end)]
+    workers = workers or os.cpu_count() or 1
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        if tasks:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=mp_context,
+                                     initializer=pdf_template) as executor:
+                for work_order_id, pdf_bytes in executor.map(render_ticket, tasks, chunksize=chunksize):
+                    archive.writestr(f"WO_{work_order_id}.pdf", pdf_bytes)
+    return buffer.getvalue(), len(tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the pick tickets of every work order for a site into a zip of PDFs.")
+    parser.add_argument("site_id", help="Target Site ID")
+    parser.add_argument("--from", dest="start", help="first scheduled date to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", help="last scheduled date to include (YYYY-MM-DD)")
+    parser.add_argument("--pick-list", help="published pick list (.arrow or .xlsx); defaults to the navigator's")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("-o", "--output", help="zip file to write (default: pick_tickets_<site>.zip)")
+    args = parser.parse_args()
+
+    pick_list = read_pick_list(args.pick_list or published_pick_list())
+    archive, count = render_batch(pick_list, args.site_id, args.start, args.end, args.workers)
+    output = args.output or f"pick_tickets_{args.site_id}.zip"
+    with open(output, "wb") as f:
+        f.write(archive)
+    print(f"{count} pick tickets written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# Production pick list generation: load work orders, inventory and the swap list, allocate lots earliest
+# expiry first, and export the pick list. `run` does a whole run; the steps are usable on their own so a
+# long-lived process can keep its data in memory and allocate again on demand.
+from .allocation import LotPool, LotStore, allocate, prepare
+from .export import export_pick_list, output_paths, write_pick_list_arrow
+from .instrumentation import RunRecorder
+from .pipeline import load, run
+from .scenarios import Scenarios, load_scenarios
+from .snapshots import SnapshotCache
+from .sources import DataSource, load_excel
+from .state import load_state, save_state
@@ -0,0 +1,561 @@
+import bisect
+import heapq
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import RunRecorder
+from .sources import inventory_dtypes, inventory_filter, work_order_dtypes
+
+# Prepare loaded work orders and inventory for allocation. With a previous state, the loaded rows are the delta
+# queries' and are merged into the state's snapshot, and changed_keys holds the changed-key queries' (work order
+# keys, pool keys) rows. Returns the work order lines to allocate (indexed by scheduled position), the lines this
+# run replaced, the inventory, and the changed (pools, work orders) or None.
+def prepare(work_orders, inventory, state=None, changed_keys=None):
+    # Pools and work orders the delta queries returned, before any filtering drops their rows, and those that
+    # changed with no rows left to return: work orders that were closed or deleted and pools that were emptied
+    changes = None
+    if state is not None:
+        changed_pools = set(zip(inventory['SITE_ID'].tolist(), inventory['ITEM_ID'].tolist()))
+        changed_work_orders = set(work_orders['WORKORDER_ID'].tolist())
+        if changed_keys is not None:
+            work_order_keys, pool_keys = changed_keys
+            changed_work_orders |= set(work_order_keys['WORKORDER_ID'].tolist())
+            changed_pools |= set(zip(pool_keys['SITE_ID'].tolist(), pool_keys['ITEM_ID'].tolist()))
+        changes = (changed_pools, changed_work_orders)
+        inventory = inventory[inventory_filter(inventory)]
+
+    # Convert columns to correct types
+    work_orders['COMP_ITEMID'] = pd.to_numeric(work_orders['COMP_ITEMID'], errors='coerce').dropna().astype(int)
+
+    # Identify each line by its work order and its place in that work order's BOM
+    work_orders['LINE_ID'] = work_orders['WORKORDER_ID'].astype(str) + '/' + work_orders.groupby('WORKORDER_ID').cumcount().astype(str)
+    work_orders['REMOVED'] = False
+
+    # Merge the changes into the previous snapshot: changed work orders and pools are replaced whole
+    if state is not None:
+        previous_work_orders = state['work_orders']
+        replaced = previous_work_orders['WORKORDER_ID'].isin(changed_work_orders)
+        removed_lines = previous_work_orders[replaced].assign(REMOVED=True)
+        work_orders = pd.concat([previous_work_orders[~replaced], work_orders, removed_lines], ignore_index=True)
+
+        previous_inventory = state['inventory']
+        previous_pools = pd.MultiIndex.from_arrays([previous_inventory['SITE_ID'], previous_inventory['ITEM_ID']])
+        inventory = pd.concat([previous_inventory[~previous_pools.isin(list(changed_pools))], inventory], ignore_index=True)
+
+        # Merged frames only keep a categorical dtype where both sides had the same categories
+        work_orders = work_orders.astype({column: 'category' for column, dtype in work_order_dtypes.items() if dtype == 'category'})
+        inventory = inventory.astype({column: 'category' for column, dtype in inventory_dtypes.items() if dtype == 'category'})
+
+    # Sort data; lines scheduled together keep a fixed order so runs are repeatable
+    work_orders.sort_values(by=['SCHED_DATETIME', 'WORKORDER_ID', 'SEQ_NUM'], inplace=True, kind='stable')
+    work_orders.reset_index(drop=True, inplace=True)
+    inventory.sort_values(by=['ITEM_ID', 'EXPDATE'], inplace=True)
+
+    # Lines replaced by this run only take part in working out what changed; the index is each line's scheduled position
+    removed_lines = work_orders[work_orders['REMOVED']]
+    work_orders = work_orders[~work_orders['REMOVED']]
+    return work_orders, removed_lines, inventory, changes
+
+# The lots of every (SITE_ID, ITEM_ID) pool in one set of arrays, holding only the columns the allocator reads.
+# Built in one vectorized pass: lots are grouped by pool, keeping their earliest-expiry-first order within it.
+# `pools` maps each pool to a LotPool over its slice of the arrays; `sites` and `pool_begins` give each lot's
+# pool site and where its pool starts.
+class LotStore:
+    __slots__ = ('qty', 'lot_ids', 'loc_ids', 'expdates', 'item_descs', 'stock_uoms', 'sites', 'pool_begins', 'pools')
+
+    def __init__(self, inventory):
+        pool_codes, pool_keys = pd.MultiIndex.from_arrays([inventory['SITE_ID'], inventory['ITEM_ID']]).factorize()
+        order = np.argsort(pool_codes, kind='stable')
+        bounds = np.searchsorted(pool_codes[order], np.arange(len(pool_keys) + 1))
+
+        self.qty = inventory['QTYTOTAL'].to_numpy(dtype=np.float64, na_value=0.0)[order]
+        self.lot_ids = inventory['LOTID'].to_numpy()[order]
+        self.loc_ids = inventory['LOC_ID'].to_numpy()[order]
+        self.expdates = inventory['EXPDATE'].to_numpy()[order]
+        self.item_descs = inventory['ITEMDESC'].to_numpy()[order]
+        self.stock_uoms = inventory['STOCK_UOM'].to_numpy()[order]
+        pool_keys = pool_keys.tolist()
+        self.sites = np.repeat(np.array([site for site, _ in pool_keys], dtype=object), np.diff(bounds))
+        self.pool_begins = np.repeat(bounds[:-1], np.diff(bounds))
+        self.pools = {key: LotPool(self.qty, begin, end)
+                      for key, begin, end in zip(pool_keys, bounds[:-1].tolist(), bounds[1:].tolist())}
+
+# Lots a draw takes one by one before reading the rest of the pool as arrays
+scalar_lots = 8
+
+# Lots of one (SITE_ID, ITEM_ID) pool in earliest-expiry-first order, as a view of the lots begin:end of a qty
+# array. `start` is the first lot that may still have stock, so used-up lots are never rescanned.
+class LotPool:
+    __slots__ = ('qty', 'begin', 'start')
+
+    def __init__(self, qty, begin, end):
+        self.qty = qty[begin:end]
+        self.begin = begin
+        self.start = 0
+
+    # Take up to qty_needed from the pool, whole lots first and the covering lot partially. Most draws are
+    # covered within the first few lots left, which are taken one by one on scalars; past those, lots are read in
+    # windows that double in size, so a draw only reads about as many lots as it picks.
+    # Returns the picked lot positions and the quantity picked from each as lists, and the qty still needed.
+    def draw(self, qty_needed):
+        positions, picked = [], []
+        if not qty_needed > 0:
+            return positions, picked, qty_needed
+
+        qty = self.qty
+        qty_left = qty_needed
+        begin, end = self.start, min(qty.size, self.start + scalar_lots)
+        while begin < end and qty_left > 0:
+            lot_qty = float(qty[begin])
+            if lot_qty > 0:
+                positions.append(begin)
+                if qty_left - lot_qty <= 0:
+                    picked.append(float(qty_left))
+                    qty[begin] = lot_qty - qty_left
+                    qty_left = 0
+                else:
+                    picked.append(lot_qty)
+                    qty[begin] = 0.0
+                    qty_left -= lot_qty
+            begin += 1
+
+        size = scalar_lots
+        while qty_left > 0 and begin < qty.size:
+            available = qty[begin:begin + size]
+            in_stock = np.flatnonzero(available > 0)
+            if in_stock.size:
+                # Demand left after taking each in-stock lot whole, subtracted in lot order
+                remaining = np.subtract.accumulate(np.concatenate(([qty_left], available[in_stock])))
+                # First lot that leaves nothing outstanding covers the rest of the demand
+                cut = int(np.searchsorted(-remaining[1:], 0, side='left'))
+                window_picked = available[in_stock[:cut + 1]]
+                if cut < in_stock.size:
+                    window_picked[-1] = remaining[cut]
+                    qty_left = 0
+                else:
+                    qty_left = float(remaining[-1])
+                window_positions = begin + in_stock[:cut + 1]
+                qty[window_positions] -= window_picked
+                positions.extend(window_positions.tolist())
+                picked.extend(window_picked.tolist())
+            begin += size
+            size *= 2
+
+        if positions:
+            last = positions[-1]
+            self.start = last if qty[last] > 0 else last + 1
+        return positions, picked, qty_left
+
+# Swap levels in order of precedence: the most specific override wins
+override_levels = [
+    ('Work Order', 'Work Order ID'),
+    ('Batch', 'Production Batch Number'),
+    ('Project', 'Project Number'),
+]
+
+# Index the swap list once as {swap level: {(level key, original item): substitute item}}
+def build_override_index(overrides):
+    override_index = {level: {} for level, _ in override_levels}
+    if overrides.empty:
+        return override_index
+
+    for level, key_column in override_levels:
+        level_rows = overrides[overrides['Swap Level'] == level]
+        for key, original_item, substitute_item in zip(level_rows[key_column],
+                                                       level_rows['Original KBI Item Number'],
+                                                       level_rows['Substitute KBI Item Number']):
+            if pd.isna(key) or pd.isna(original_item):
+                continue
+            # Keep the first entry in the list for a given key, as before
+            override_index[level].setdefault((key, original_item), substitute_item)
+    return override_index
+
+# Function to get substitute based on override levels
+def get_substitute(override_index, item_id, workorder_id, project_number, batch_number):
+    level_keys = {
+        'Work Order': workorder_id,
+        'Batch': batch_number,
+        'Project': project_number,
+    }
+    for level, _ in override_levels:
+        substitute = override_index[level].get((level_keys[level], item_id))
+        if substitute is not None:
+            return substitute
+    return item_id
+
+# Index the substitute BOM lines (ORIG_CODE 'S') once by the work order and sequence number they cover
+def build_substitute_index(work_orders):
+    substitute_lines = work_orders[work_orders['ORIG_CODE'] == 'S']
+    substitute_index = {}
+    for workorder_id, seq_num, item_id in zip(substitute_lines['WORKORDER_ID'],
+                                              substitute_lines['SEQ_NUM'],
+                                              substitute_lines['COMP_ITEMID']):
+        if pd.notna(item_id):
+            substitute_index.setdefault((workorder_id, seq_num), item_id)
+    return substitute_index
+
+# Function to find substitute if original quantity is insufficient
+def find_substitute(substitute_index, workorder_id, original_seq_num):
+    return substitute_index.get((workorder_id, original_seq_num))
+
+# Pools a line can draw item_id from: its own site, after site 5 for site 2 lines
+def line_pools(site_id, item_id):
+    site_options = [site_id]
+    if site_id == '2':
+        site_options.insert(0, '5')
+    return [(site, item_id) for site in site_options]
+
+# Pick list columns, followed by the allocation-state columns kept only in the saved state
+pick_list_columns = [
+    "Project Number", "Batch ID", "Production ID", "Custom Data", "BoM Custom Data", "Work Order ID", "Item ID",
+    "Original/Substitute", "Total Qty to Pick", "Lot Qty to Pick", "Lot ID", "Location ID", "Expiration Date",
+    "Item Description", "Stock UoM", "Source Site ID", "Target Site ID", "Scheduled Date", "Unfulfilled Qty",
+    "Allocation Status",
+]
+state_columns = ['_phase', '_line', '_lot']
+
+# Allocate qty_needed to an allocation event from its pools in lot_pools, earliest expiry first. Each pick is
+# appended to picks as (event number, lot, qty picked, qty needed, qty unfulfilled after it), where lot indexes
+# the array the pools are views of. Returns the qty still needed.
+def allocate_line(lot_pools, picks, event_number, pools, qty_needed):
+    original_qty_needed = qty_needed
+
+    total_allocated = 0
+    for pool in pools:
+        lot_pool = lot_pools.get(pool)
+        if lot_pool is None:
+            continue
+
+        positions, picked, qty_needed = lot_pool.draw(qty_needed)
+
+        for position, qty_to_pick in zip(positions, picked):
+            total_allocated += qty_to_pick
+            picks.append((event_number, lot_pool.begin + position, qty_to_pick, original_qty_needed,
+                          original_qty_needed - total_allocated))
+
+        if qty_needed <= 0:
+            break
+
+    return qty_needed
+
+# The work order line fields allocation reads, as a module-level namedtuple rather than itertuples() rows
+WorkOrderLine = namedtuple('WorkOrderLine', [
+    'Index', 'WORKORDER_ID', 'SEQ_NUM', 'COMP_ITEMID', 'ORIG_CODE', 'QTY', 'SITE_ID', 'PROJECT_NUMBER',
+    'PROD_BATCH_NUM', 'PROD_ITEMID', 'CUSTOM_DATA1', 'BOM_CUSTOM_DATA1', 'SCHED_DATETIME', 'LINE_ID',
+])
+
+def work_order_lines(work_orders):
+    # Whole columns as lists: iterating a Series value by value is slow for Arrow-backed strings
+    columns = [work_orders[field].tolist() for field in WorkOrderLine._fields[1:]]
+    return map(WorkOrderLine._make, zip(work_orders.index.tolist(), *columns))
+
+# Allocation events keyed by (phase, scheduled position): phase 0 allocates a line's own demand and phase 1
+# its deferred shortfall to the substitute line, so every substitute is allocated after all primary lines
+def build_events(work_orders, override_index, substitute_index):
+    events = {}
+    for row in work_order_lines(work_orders):
+        if row.ORIG_CODE == 'S':
+            continue
+
+        item_id = get_substitute(override_index, row.COMP_ITEMID, row.WORKORDER_ID, row.PROJECT_NUMBER, row.PROD_BATCH_NUM)
+        events[(0, row.Index)] = (row, item_id, line_pools(row.SITE_ID, item_id))
+
+        substitute_item = find_substitute(substitute_index, row.WORKORDER_ID, row.SEQ_NUM)
+        if substitute_item is not None and substitute_item != item_id:
+            events[(1, row.Index)] = (row, substitute_item, line_pools(row.SITE_ID, substitute_item))
+    return events
+
+# The events that may draw on each pool, in allocation order
+def pool_event_index(events):
+    pool_events = defaultdict(list)
+    for event in sorted(events):
+        for pool in events[event][2]:
+            pool_events[pool].append(event)
+    return pool_events
+
+# Work out which events must run again after a change. A pool is changed from its earliest changed event on;
+# an event that may draw on a pool at or after that point runs again, and so changes every pool it may draw on
+# from that event on. Returns the events to run and the pools they touch.
+def events_to_rerun(events, changed_pools, changed_events, pool_events=None):
+    if pool_events is None:
+        pool_events = pool_event_index(events)
+
+    first_change = {}
+    pending = []
+    rerun = set()
+
+    def change_pool(pool, event):
+        if pool not in first_change or event < first_change[pool]:
+            first_change[pool] = event
+            heapq.heappush(pending, (event, pool))
+
+    def rerun_event(event):
+        if event in rerun or event not in events:
+            return
+        rerun.add(event)
+        for pool in events[event][2]:
+            change_pool(pool, event)
+        # A new shortfall on the line changes its substitute demand
+        if event[0] == 0:
+            rerun_event((1, event[1]))
+
+    for pool, event in changed_pools:
+        change_pool(pool, event)
+    for event in changed_events:
+        rerun_event(event)
+
+    while pending:
+        event, pool = heapq.heappop(pending)
+        if first_change[pool] != event:
+            continue
+        later_events = pool_events.get(pool, [])
+        for later_event in later_events[bisect.bisect_left(later_events, event):]:
+            rerun_event(later_event)
+
+    return rerun, set(first_change)
+
+# Run allocation events (event number, phase, line ID, qty, pools) in the given order, drawing from lot_pools.
+# Each line's shortfall is recorded in shortfalls_by_line, which also holds the shortfall a substitute event
+# allocates. Returns the picks as allocate_line() records them.
+def allocate_events(events, lot_pools, shortfalls_by_line):
+    picks = []
+    for event_number, phase, line_id, qty, pools in events:
+        if phase == 0:
+            shortfalls_by_line[line_id] = allocate_line(lot_pools, picks, event_number, pools, qty)
+        elif shortfalls_by_line.get(line_id, 0) > 0:
+            allocate_line(lot_pools, picks, event_number, pools, shortfalls_by_line[line_id])
+    return picks
+
+# Picks as allocate_line() records them, one array per field
+def pick_arrays(picks):
+    if not picks:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), *(np.zeros(0, np.float64) for _ in range(3))
+    event_numbers, lots, qty_picked, qty_needed, qty_unfulfilled = zip(*picks)
+    return (np.array(event_numbers, np.int64), np.array(lots, np.int64), np.array(qty_picked, np.float64),
+            np.array(qty_needed, np.float64), np.array(qty_unfulfilled, np.float64))
+
+# Worker entry point: allocate one group of independent events against its own copy of their pools' lot
+# quantities, laid out back to back with pool_bounds. Returns the picks as arrays, with lots indexing qty,
+# and the shortfalls of the task's lines.
+def allocate_component(task):
+    events, pool_keys, pool_bounds, qty, shortfalls_by_line = task
+    lot_pools = {pool: LotPool(qty, begin, end)
+                 for pool, begin, end in zip(pool_keys, pool_bounds[:-1].tolist(), pool_bounds[1:].tolist())}
+    picks = allocate_events(events, lot_pools, shortfalls_by_line)
+    return pick_arrays(picks), shortfalls_by_line
+
+# Split the events to run into groups that never compete for stock. Two events are connected when they may draw
+# on a common pool, or when they are the primary and substitute events of one line, whose substitute demand is
+# the primary's shortfall. Returns the connected components as lists of events, largest first.
+def allocation_components(events, events_to_run):
+    parent = {}
+
+    def find(pool):
+        parent.setdefault(pool, pool)
+        while parent[pool] != pool:
+            parent[pool] = parent[parent[pool]]
+            pool = parent[pool]
+        return pool
+
+    def union(pool, other_pool):
+        parent[find(other_pool)] = find(pool)
+
+    # Most events link pools already linked, so each distinct link is only joined once
+    links = set()
+    for event in events_to_run:
+        pools = events[event][2]
+        for pool in pools[1:]:
+            links.add((pools[0], pool))
+        if event[0] == 1 and (0, event[1]) in events_to_run:
+            links.add((events[(0, event[1])][2][0], pools[0]))
+    for pool, other_pool in links:
+        union(pool, other_pool)
+
+    roots = {}
+    components = defaultdict(list)
+    for event in events_to_run:
+        pool = events[event][2][0]
+        if pool not in roots:
+            roots[pool] = find(pool)
+        components[roots[pool]].append(event)
+    return sorted(components.values(), key=len, reverse=True)
+
+# Allocate the events to run over a process pool started with mp_context (the platform default if None).
+# Components are packed into about four tasks per worker, each allocated in scheduled order against a copy of
+# its pools' lot quantities; workers return their picks as arrays, merged back into the order a single pass
+# emits them. Updates shortfalls_by_line and returns the picks as pick_arrays() with lots indexing the store.
+def allocate_in_parallel(events, event_keys, run_events, store, shortfalls_by_line, workers, mp_context=None):
+    event_numbers = {event: event_number for event_number, event in enumerate(event_keys)}
+    components = allocation_components(events, event_numbers)
+    task_count = min(len(components), workers * 4)
+    task_events = [[] for _ in range(task_count)]
+    task_loads = [(0, task) for task in range(task_count)]
+    for component in components:
+        load, task = heapq.heappop(task_loads)
+        task_events[task].extend(component)
+        heapq.heappush(task_loads, (load + len(component), task))
+
+    tasks = []
+    task_lots = []
+    for task_keys in task_events:
+        task_numbers = sorted(event_numbers[event] for event in task_keys)
+        task_pools = [pool for pool in dict.fromkeys(pool for number in task_numbers for pool in run_events[number][4])
+                      if pool in store.pools]
+        slices = [(store.pools[pool].begin, store.pools[pool].begin + store.pools[pool].qty.size) for pool in task_pools]
+        lots = np.concatenate([np.arange(begin, end) for begin, end in slices] or [np.zeros(0, np.int64)])
+        task_lines = {run_events[number][2] for number in task_numbers}
+        tasks.append((
+            [run_events[number] for number in task_numbers],
+            task_pools,
+            np.concatenate(([0], np.cumsum([end - begin for begin, end in slices], dtype=np.int64))),
+            store.qty[lots],
+            {line_id: shortfalls_by_line[line_id] for line_id in task_lines if line_id in shortfalls_by_line},
+        ))
+        task_lots.append(lots)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=min(workers, task_count), mp_context=mp_context) as executor:
+        for lots, ((event_numbers, task_picked_lots, *quantities), task_shortfalls) in zip(
+                task_lots, executor.map(allocate_component, tasks)):
+            results.append((event_numbers, lots[task_picked_lots], *quantities))
+            shortfalls_by_line.update(task_shortfalls)
+
+    # Picks of one event all come from one task, already in order; event numbers follow the single-pass order
+    merged = [np.concatenate(arrays) for arrays in zip(*results)] if results else list(pick_arrays([]))
+    order = np.argsort(merged[0], kind='stable')
+    return tuple(array[order] for array in merged)
+
+# Pick list rows, with state columns, for picks as pick_arrays() returns them: the line fields come from
+# work_orders by each event's scheduled position, the lot fields from the store. Every pick takes some stock,
+# so a pick's line is fully allocated once nothing is left unfulfilled and partially allocated until then.
+def pick_rows(picks, event_keys, event_items, work_orders, store):
+    event_numbers, lots, qty_picked, qty_needed, qty_unfulfilled = picks
+    if not event_numbers.size:
+        return pd.DataFrame([], columns=pick_list_columns + state_columns)
+
+    phases = np.array([phase for phase, _ in event_keys], np.int64)[event_numbers]
+    positions = np.array([position for _, position in event_keys])[event_numbers]
+    rows = work_orders.index.get_indexer(positions)
+    line = {column: work_orders[column].take(rows).tolist() for column in (
+        'PROJECT_NUMBER', 'PROD_BATCH_NUM', 'PROD_ITEMID', 'CUSTOM_DATA1', 'BOM_CUSTOM_DATA1', 'WORKORDER_ID',
+        'ORIG_CODE', 'SITE_ID', 'LINE_ID')}
+    return pd.DataFrame({
+        "Project Number": line['PROJECT_NUMBER'],
+        "Batch ID": line['PROD_BATCH_NUM'],
+        "Production ID": line['PROD_ITEMID'],
+        "Custom Data": line['CUSTOM_DATA1'],
+        "BoM Custom Data": line['BOM_CUSTOM_DATA1'],
+        "Work Order ID": line['WORKORDER_ID'],
+        "Item ID": [event_items[event_number] for event_number in event_numbers.tolist()],
+        "Original/Substitute": np.where(phases == 0, np.array(line['ORIG_CODE'], dtype=object), 'S').tolist(),
+        "Total Qty to Pick": qty_needed,
+        "Lot Qty to Pick": qty_picked,
+        "Lot ID": store.lot_ids[lots].tolist(),
+        "Location ID": store.loc_ids[lots].tolist(),
+        "Expiration Date": store.expdates[lots],
+        "Item Description": store.item_descs[lots].tolist(),
+        "Stock UoM": store.stock_uoms[lots].tolist(),
+        "Source Site ID": store.sites[lots].tolist(),
+        "Target Site ID": line['SITE_ID'],
+        "Scheduled Date": work_orders['SCHED_DATETIME'].to_numpy()[rows],
+        "Unfulfilled Qty": qty_unfulfilled,
+        "Allocation Status": np.where(qty_unfulfilled == 0, "Fully Allocated", "Partially Allocated").tolist(),
+        "_phase": phases,
+        "_line": line['LINE_ID'],
+        "_lot": lots - store.pool_begins[lots],
+    })
+
+# Order picks as a full run emits them: primary lines in scheduled order, then the substitutes
+def in_allocation_order(picks, line_positions):
+    if picks.empty:
+        return picks
+    picks = picks.assign(_position=[line_positions[line_id] for line_id in picks['_line'].tolist()])
+    return picks.sort_values(by=['_phase', '_position'], kind='stable').drop(columns='_position')
+
+# Allocate inventory to the prepared work order lines: primary lines in scheduled order, then the deferred
+# substitute demand in the same pass. With a previous state and the changes from prepare(), only the events
+# the changes reach are allocated again and the other picks are kept. Does not modify its arguments.
+# With workers above 1, independent groups of pools are allocated in that many worker processes, started with
+# mp_context; pass a "forkserver" or "spawn" context from a multi-threaded process, where forking can deadlock.
+# events and pool_events are the allocation events of work_orders under overrides and their pool_event_index(),
+# when the caller already has them. Returns the picks (pick list and state columns) and each line's shortfall.
+def allocate(work_orders, inventory, overrides, removed_lines=None, state=None, changes=None, recorder=None,
+             workers=1, mp_context=None, events=None, pool_events=None):
+    recorder = recorder or RunRecorder()
+
+    if events is None:
+        override_index = build_override_index(overrides)
+        substitute_index = build_substitute_index(work_orders)
+        events = build_events(work_orders, override_index, substitute_index)
+    recorder.end_stage('substitutes', len(work_orders), len(events))
+
+    if state is None:
+        events_to_run = set(events)
+        affected_pools = None
+        kept_picks = pd.DataFrame()
+        shortfalls_by_line = {}
+    else:
+        changed_pools, changed_work_orders = changes
+        # Inventory changes affect their pools from the start; replaced lines affect the pools they drew on
+        # from their old position, and their new lines always run
+        inventory_changed = (-1, -1)
+        pool_changes = [(pool, inventory_changed) for pool in changed_pools]
+        removed_positions = dict(zip(removed_lines['LINE_ID'].tolist(), removed_lines.index.tolist()))
+        previous_picks = state['picks']
+        pick_events = list(zip(previous_picks['_phase'].tolist(), previous_picks['_line'].tolist()))
+        for (phase, line_id), site_id, item_id in zip(pick_events, previous_picks['Source Site ID'].tolist(),
+                                                      previous_picks['Item ID'].tolist()):
+            if line_id in removed_positions:
+                pool_changes.append(((site_id, item_id), (phase, removed_positions[line_id])))
+        new_events = [event for event, (row, _, _) in events.items() if row.WORKORDER_ID in changed_work_orders]
+
+        events_to_run, affected_pools = events_to_rerun(events, pool_changes, new_events, pool_events)
+
+        # Picks of events that do not run again stand as they are
+        kept_events = {(event[0], row.LINE_ID) for event, (row, _, _) in events.items() if event not in events_to_run}
+        kept = [pick_event in kept_events for pick_event in pick_events]
+        kept_picks = previous_picks[kept]
+        shortfalls_by_line = dict(zip(state['shortfalls']['LINE_ID'].tolist(), state['shortfalls']['SHORTFALL'].tolist()))
+        print(f"Re-allocating {len(events_to_run)} of {len(events)} allocation events over {len(affected_pools)} pools.")
+    recorder.end_stage('planning', len(events), len(events_to_run))
+
+    # Create inventory lot pools for the pools being allocated
+    if affected_pools is not None:
+        inventory_pools = pd.MultiIndex.from_arrays([inventory['SITE_ID'], inventory['ITEM_ID']])
+        pool_inventory = inventory[inventory_pools.isin(list(affected_pools))]
+    else:
+        pool_inventory = inventory
+    store = LotStore(pool_inventory)
+    lot_pools = store.pools
+    recorder.end_stage('lot pools', len(pool_inventory), len(lot_pools))
+
+    line_positions = dict(zip(work_orders['LINE_ID'].tolist(), work_orders.index.tolist()))
+
+    # Take what the kept picks drew from those pools, in the order they were allocated
+    kept_picks = in_allocation_order(kept_picks, line_positions)
+    if not kept_picks.empty:
+        for site_id, item_id, position, qty_picked in zip(kept_picks['Source Site ID'], kept_picks['Item ID'],
+                                                          kept_picks['_lot'], kept_picks['Lot Qty to Pick']):
+            lot_pool = lot_pools.get((site_id, item_id))
+            if lot_pool is not None:
+                lot_pool.qty[position] -= qty_picked
+
+    event_keys = sorted(events_to_run)
+    run_events = [(event_number, event[0], events[event][0].LINE_ID, events[event][0].QTY, events[event][2])
+                  for event_number, event in enumerate(event_keys)]
+    if workers > 1 and len(event_keys) > 1:
+        picks = allocate_in_parallel(events, event_keys, run_events, store, shortfalls_by_line, workers, mp_context)
+    else:
+        picks = pick_arrays(allocate_events(run_events, lot_pools, shortfalls_by_line))
+    recorder.end_stage('allocation', len(event_keys), len(picks[0]))
+
+    pick_list = pick_rows(picks, event_keys, [events[event][1] for event in event_keys], work_orders, store)
+    if not kept_picks.empty:
+        pick_list = in_allocation_order(pd.concat([kept_picks, pick_list], ignore_index=True), line_positions)
+
+    shortfalls = pd.DataFrame({'LINE_ID': list(line_positions)})
+    shortfalls['SHORTFALL'] = shortfalls['LINE_ID'].map(shortfalls_by_line)
+    return pick_list, shortfalls
@@ -0,0 +1,71 @@
+import argparse
+import json
+import warnings
+
+import pandas as pd
+
+from .export import output_paths
+from .instrumentation import RunRecorder
+from .pipeline import run
+from .snapshots import SnapshotCache
+from .sources import DataSource
+
+# Folder with the SQL queries
+query_dir = "C:\\Users\\sdunna\\OneDrive - KBI Biopharma\\Documents - CMF-SC\\Pick List Files"
+
+# File path for SharePoint file
+override_file = "C:\\Users\\sdunna\\OneDrive - KBI Biopharma\\Planner WO BOM Swaps\\Planners WO BOM Swaps List.xlsx"
+
+# Output pick list, and the allocation state kept next to it for incremental runs
+pick_list_file = "C:\\Users\\sdunna\\OneDrive - KBI Biopharma\\Documents - CMF-SC\\Pick List Files\\Pick List.xlsx"
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate the production pick list.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only re-allocate what changed since the previous run's saved state.")
+    parser.add_argument("--batch-size", type=int, default=50000,
+                        help="Rows fetched from SQL Server per round trip.")
+    parser.add_argument("--query-dir", default=query_dir,
+                        help="Folder with the .sql query files.")
+    parser.add_argument("--sqlite", metavar="DATABASE",
+                        help="Run the queries against a SQLite database instead of SQL Server.")
+    parser.add_argument("--csv-dir", metavar="FOLDER",
+                        help="Read each query's rows from <query name>.csv in FOLDER instead of SQL Server.")
+    parser.add_argument("--snapshot-max-age", type=float, metavar="MINUTES",
+                        help="Reuse the work order and inventory rows saved in the Pick List Snapshots folder next to "
+                             "the pick list when they were fetched at most MINUTES ago, and save the rows fetched.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="With --snapshot-max-age, fetch from the database even if a snapshot is fresh.")
+    parser.add_argument("--swap-list", default=override_file,
+                        help="Planners WO BOM Swaps List workbook.")
+    parser.add_argument("--xlsx", action=argparse.BooleanOptionalAction, default=True,
+                        help="Also export Pick List.xlsx next to the Arrow pick list.")
+    parser.add_argument("--pick-list", default=pick_list_file,
+                        help="Pick List.xlsx to write; the Arrow pick list and the saved state go next to it.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Allocate independent groups of items and sites in this many processes.")
+    parser.add_argument("--timings", metavar="FILE",
+                        help="Write the wall time of each stage of the run to FILE as JSON.")
+    parser.add_argument("--profile", choices=["cpu", "memory"], action="append", default=[],
+                        help="Write a cProfile (cpu) or tracemalloc (memory) report for each stage to the Pick List "
+                             "Profile folder next to the pick list. May be given twice.")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Ignore the FutureWarning related to DataFrame concatenation
+    warnings.simplefilter(action='ignore', category=FutureWarning)
+
+    paths = output_paths(args.pick_list)
+    recorder = RunRecorder(args.profile, paths['profile_dir'])
+    snapshots = None
+    if args.snapshot_max_age is not None:
+        snapshots = SnapshotCache(paths['snapshot_dir'], pd.Timedelta(minutes=args.snapshot_max_age), args.refresh)
+    source = DataSource(args.query_dir, args.sqlite, args.csv_dir, args.batch_size, snapshots=snapshots)
+    run(source, args.swap_list, args.pick_list, args.incremental, args.xlsx, recorder=recorder,
+        workers=args.workers)
+
+    if args.timings:
+        with open(args.timings, 'w') as file:
+            json.dump(recorder.stage_times, file, indent=2)
@@ -0,0 +1,71 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from .allocation import state_columns
+from .instrumentation import peak_memory_mb
+
+# Files written next to the pick list: the Arrow pick list, the shortage and status rollups, the saved state,
+# the run summary, the profiling reports and the query snapshots
+def output_paths(pick_list_file):
+    folder = os.path.dirname(pick_list_file)
+    return {
+        'pick_list': pick_list_file,
+        'arrow': os.path.splitext(pick_list_file)[0] + ".arrow",
+        'shortages': os.path.splitext(pick_list_file)[0] + " Shortages.arrow",
+        'status': os.path.splitext(pick_list_file)[0] + " Status.arrow",
+        'state_dir': os.path.join(folder, "Pick List State"),
+        'run_summary': os.path.splitext(pick_list_file)[0] + " Run Summary.json",
+        'profile_dir': os.path.join(folder, "Pick List Profile"),
+        'snapshot_dir': os.path.join(folder, "Pick List Snapshots"),
+    }
+
+# Write a frame as an uncompressed Arrow IPC file, so it can be memory-mapped, stamped with the time its run
+# generated it. Written to a temporary file and moved into place so readers never see a partial file.
+def write_arrow(frame, path, generated):
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b'generated': generated.isoformat().encode()}
+    temp_path = path + ".tmp"
+    feather.write_feather(table.replace_schema_metadata(metadata), temp_path, compression='uncompressed')
+    os.replace(temp_path, path)
+
+# Typed pick list for the navigator as a stamped Arrow file; generated defaults to now
+def write_pick_list_arrow(pick_list, path, generated=None):
+    pick_list = pick_list.reset_index(drop=True)
+    pick_list["Work Order ID"] = pick_list["Work Order ID"].astype(str).str.zfill(8)
+    for column in ("Source Site ID", "Target Site ID"):
+        pick_list[column] = pick_list[column].astype(str)
+    for column in ("Expiration Date", "Scheduled Date"):
+        pick_list[column] = pd.to_datetime(pick_list[column], errors='coerce')
+
+    write_arrow(pick_list, path, pd.Timestamp.now() if generated is None else generated)
+
+# Save the pick list without its state columns: always as Arrow, and as Excel when xlsx is set
+def export_pick_list(pick_list, pick_list_file, xlsx=True, generated=None):
+    pick_list = pick_list.drop(columns=state_columns)
+    write_pick_list_arrow(pick_list, output_paths(pick_list_file)['arrow'], generated)
+    if xlsx:
+        pick_list.to_excel(pick_list_file, index=False)
+    return pick_list
+
+# Machine-readable summary of a run, moved into place like the Arrow file
+def write_run_summary(path, recorder, mode, source_name, work_orders, inventory, picks, shortfalls):
+    run_summary = {
+        'started': recorder.started.isoformat(),
+        'finished': pd.Timestamp.now().isoformat(),
+        'mode': mode,
+        'source': source_name,
+        'seconds': sum(record['seconds'] for record in recorder.stages),
+        'process_peak_memory_mb': peak_memory_mb(),
+        'work_order_lines': len(work_orders),
+        'inventory_lots': len(inventory),
+        'picks': len(picks),
+        'short_lines': int((shortfalls['SHORTFALL'] > 0).sum()),
+        'stages': recorder.stages,
+    }
+    with open(path + ".tmp", 'w') as file:
+        json.dump(run_summary, file, indent=2)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,96 @@
+import cProfile
+import os
+import pstats
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Peak memory of the process: resource on Linux/macOS, psutil (if installed) on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Peak memory of the process so far in MB, or None where it cannot be read
+def peak_memory_mb():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in KB elsewhere
+        return peak / 2**20 if os.uname().sysname == 'Darwin' else peak / 2**10
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / 2**20
+    return None
+
+# Stages of a run as they finish: wall time, rows in and out, and the process's peak memory so far, which is
+# the process-wide high-water mark rather than the stage's own. Each stage is measured from the end of the
+# previous one, the first from when the recorder is created. Stage wall times are also kept by name. With
+# profile ['cpu'] and/or ['memory'], a cProfile and/or tracemalloc report of each stage is written to
+# profile_dir; memory profiling also records the stage's own peak traced memory as traced_peak_mb.
+class RunRecorder:
+    def __init__(self, profile=(), profile_dir=None):
+        self.started = pd.Timestamp.now()
+        self.stages = []
+        self.stage_times = {}
+        self.profile = list(profile)
+        self.profile_dir = profile_dir
+
+        if self.profile:
+            os.makedirs(profile_dir, exist_ok=True)
+        self.profiler = cProfile.Profile() if 'cpu' in self.profile else None
+        if 'memory' in self.profile:
+            tracemalloc.start()
+        self.memory_snapshot = tracemalloc.take_snapshot() if 'memory' in self.profile else None
+
+        self.stage_started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    # Write a stage's profiling reports, then reset the profilers for the next stage. The memory report lists
+    # the lines whose allocations still held at the end of the stage grew most during it.
+    def write_stage_profiles(self, prefix, record):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(prefix + ".prof")
+            with open(prefix + " cpu.txt", 'w') as file:
+                pstats.Stats(self.profiler, stream=file).sort_stats('cumulative').print_stats(40)
+            self.profiler = cProfile.Profile()
+        if self.memory_snapshot is not None:
+            record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+            snapshot = tracemalloc.take_snapshot()
+            with open(prefix + " memory.txt", 'w') as file:
+                file.write(f"Peak traced memory: {record['traced_peak_mb']:.1f} MB\n\n")
+                for statistic in snapshot.compare_to(self.memory_snapshot, 'lineno')[:40]:
+                    file.write(f"{statistic}\n")
+            self.memory_snapshot = snapshot
+            tracemalloc.reset_peak()
+
+    def end_stage(self, name, rows_in=None, rows_out=None):
+        record = {
+            'stage': name,
+            'seconds': time.perf_counter() - self.stage_started,
+            'rows_in': rows_in,
+            'rows_out': rows_out,
+            'process_peak_memory_mb': peak_memory_mb(),
+        }
+        if self.profile:
+            self.write_stage_profiles(os.path.join(self.profile_dir, f"{len(self.stages) + 1:02d} {name}"), record)
+        self.stages.append(record)
+        self.stage_times[name] = record['seconds']
+        self.stage_started = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    # Stop profiling once the last stage has ended
+    def close(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler = None
+        if self.memory_snapshot is not None:
+            tracemalloc.stop()
+            self.memory_snapshot = None
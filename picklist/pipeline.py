@@ -0,0 +1,85 @@
+import pandas as pd
+
+from .allocation import allocate, prepare
+from .export import export_pick_list, output_paths, write_run_summary
+from .instrumentation import RunRecorder
+from .rollups import write_rollups
+from .sources import (delta_loads, full_loads, inventory_query_name, load_concurrently, load_excel,
+                      work_orders_query_name)
+from .state import load_state, overrides_digest, save_state
+
+# Load the work orders, inventory and swap list concurrently. With a previous state only the changes since its
+# watermark are loaded, unless the swap list changed since, in which case the state is dropped and everything
+# is loaded. Returns the work orders, inventory, swap list, the state still in use and, for a delta load, the
+# changed-key queries' (work order keys, pool keys) rows, else None.
+def load(source, swap_list, state=None):
+    loads = full_loads(source) if state is None else delta_loads(source, state['watermark'])
+    loads['Swap list'] = lambda: load_excel(swap_list)
+
+    loaded = load_concurrently(loads)
+    overrides = loaded.pop('Swap list')
+
+    if state is not None and state['overrides_digest'] != overrides_digest(overrides):
+        print("The swap list changed since the previous run, running a full allocation.")
+        state = None
+        loaded = load_concurrently(full_loads(source))
+
+    if state is None:
+        work_orders, inventory = loaded.values()
+        return work_orders, inventory, overrides, state, None
+    work_orders, inventory, changed_work_orders, changed_pools = loaded.values()
+    return work_orders, inventory, overrides, state, (changed_work_orders, changed_pools)
+
+# Generate the pick list from source and the swap list and export it to pick_list_file, with the Arrow pick list,
+# the saved state and the run summary next to it. An incremental run starts from the given state, or else from
+# the one saved next to the pick list. workers > 1 allocates independent pools in that many processes, started
+# with mp_context (see allocate()). Returns the new state, which a long-lived caller can pass to its next run.
+def run(source, swap_list, pick_list_file, incremental=False, xlsx=True, state=None, recorder=None, workers=1,
+        mp_context=None):
+    paths = output_paths(pick_list_file)
+    recorder = recorder or RunRecorder()
+
+    if not incremental:
+        state = None
+    elif state is None:
+        state = load_state(paths['state_dir'])
+
+    # Changes made from here on are picked up by the next incremental run. The time is the database server's,
+    # as that is the clock the delta queries compare against.
+    watermark = source.server_time()
+
+    work_orders, inventory, overrides, state, changed_keys = load(source, swap_list, state)
+    # Rows reused from a snapshot are only current as of its fetch, so the next run picks up changes from there
+    if state is None:
+        watermark = min([watermark] + [source.fetched[query_name] for query_name in
+                                       (work_orders_query_name, inventory_query_name) if query_name in source.fetched])
+    loaded_rows = len(work_orders) + len(inventory)
+    recorder.end_stage('load', rows_out=loaded_rows)
+
+    work_orders, removed_lines, inventory, changes = prepare(work_orders, inventory, state, changed_keys)
+    recorder.end_stage('filter', loaded_rows, len(work_orders) + len(inventory))
+
+    picks, shortfalls = allocate(work_orders, inventory, overrides, removed_lines, state, changes, recorder,
+                                  workers, mp_context)
+
+    # Save the state for the next incremental run
+    new_state = {
+        'watermark': watermark,
+        'overrides_digest': overrides_digest(overrides),
+        'work_orders': work_orders,
+        'inventory': inventory,
+        'picks': picks,
+        'shortfalls': shortfalls,
+    }
+    save_state(paths['state_dir'], **new_state)
+
+    # The pick list and rollups of one run carry the same generated stamp
+    generated = pd.Timestamp.now()
+    export_pick_list(picks, pick_list_file, xlsx, generated)
+    write_rollups(paths, work_orders, overrides, picks, shortfalls, generated)
+    recorder.end_stage('output', len(picks), len(picks))
+    recorder.close()
+
+    write_run_summary(paths['run_summary'], recorder, 'full' if state is None else 'incremental', source.name,
+                      work_orders, inventory, picks, shortfalls)
+    return new_state
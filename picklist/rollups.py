@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from .allocation import build_override_index, get_substitute
+from .export import write_arrow
+
+# Allocation status of every primary line by LINE_ID: the shortfall left by its own demand, the quantity its
+# substitute covered, and what is still unfulfilled. Lines that got no picks at all are included.
+def line_status(work_orders, picks, shortfalls):
+    substituted = picks[picks['_phase'] == 1].groupby('_line')['Lot Qty to Pick'].sum().to_dict()
+    shortfalls_by_line = dict(zip(shortfalls['LINE_ID'].tolist(), shortfalls['SHORTFALL'].tolist()))
+    lines = work_orders[work_orders['ORIG_CODE'] != 'S']
+    line_ids = lines['LINE_ID'].tolist()
+
+    status = pd.DataFrame({
+        'WORKORDER_ID': lines['WORKORDER_ID'].to_numpy(),
+        'SITE_ID': lines['SITE_ID'].to_numpy(),
+        'SCHED_DATETIME': lines['SCHED_DATETIME'].to_numpy(),
+        'COMP_ITEMID': lines['COMP_ITEMID'].to_numpy(),
+        'QTY': lines['QTY'].to_numpy(),
+        'SHORTFALL': [shortfalls_by_line.get(line_id, 0.0) for line_id in line_ids],
+        'SUBSTITUTED': [substituted.get(line_id, 0.0) for line_id in line_ids],
+    }, index=pd.Index(line_ids, name='LINE_ID'))
+    status['UNFULFILLED'] = (status['SHORTFALL'] - status['SUBSTITUTED']).clip(lower=0)
+    status['STATUS'] = np.where(status['UNFULFILLED'] <= 0, 'Fully Allocated',
+                                np.where(status['UNFULFILLED'] >= status['QTY'], 'Not Allocated', 'Partially Allocated'))
+    return status
+
+# Line status keyed for the rollups: by target site, scheduled day and the item the line draws after swaps
+def rollup_lines(work_orders, overrides, picks, shortfalls):
+    status = line_status(work_orders, picks, shortfalls)
+    override_index = build_override_index(overrides)
+    lines = work_orders[work_orders['ORIG_CODE'] != 'S']
+    items = [get_substitute(override_index, item_id, workorder_id, project_number, batch_number)
+             for item_id, workorder_id, project_number, batch_number in zip(
+                 lines['COMP_ITEMID'].tolist(), lines['WORKORDER_ID'].tolist(), lines['PROJECT_NUMBER'].tolist(),
+                 lines['PROD_BATCH_NUM'].tolist())]
+    return pd.DataFrame({
+        'Target Site ID': status['SITE_ID'].astype(str).to_numpy(),
+        'Scheduled Date': pd.to_datetime(status['SCHED_DATETIME']).dt.normalize().to_numpy(),
+        'Item ID': items,
+        'Work Order ID': status['WORKORDER_ID'].astype(str).str.zfill(8).to_numpy(),
+        'Total Qty': status['QTY'].to_numpy(),
+        'Unfulfilled Qty': status['UNFULFILLED'].to_numpy(),
+        'Allocation Status': status['STATUS'].to_numpy(),
+    })
+
+# Short lines by site, scheduled day and item: how many work orders and lines are short and by how much
+def shortage_rollup(lines):
+    short = lines[lines['Unfulfilled Qty'] > 0]
+    return (short.groupby(['Target Site ID', 'Scheduled Date', 'Item ID'], sort=True)
+            .agg(**{'Work Orders': ('Work Order ID', 'nunique'), 'Lines': ('Work Order ID', 'size'),
+                    'Total Qty': ('Total Qty', 'sum'), 'Unfulfilled Qty': ('Unfulfilled Qty', 'sum')})
+            .reset_index())
+
+# Allocation statuses, in the order the status rollup lists them
+statuses = ['Fully Allocated', 'Partially Allocated', 'Not Allocated']
+
+# Lines of each allocation status by site and scheduled day, with the work orders that have a short line
+def status_rollup(lines):
+    keys = ['Target Site ID', 'Scheduled Date']
+    counts = pd.crosstab([lines[key] for key in keys], lines['Allocation Status']).reindex(columns=statuses, fill_value=0)
+    counts.columns.name = None
+    work_orders = lines.groupby(keys)['Work Order ID'].nunique().rename('Work Orders')
+    short_work_orders = (lines[lines['Unfulfilled Qty'] > 0].groupby(keys)['Work Order ID'].nunique()
+                         .rename('Short Work Orders'))
+    rollup = pd.concat([work_orders, short_work_orders, counts], axis=1).fillna(0)
+    return rollup.astype('int64').reset_index()
+
+# Write the shortage and status rollups as Arrow files like the Arrow pick list, stamped with the same generated
+# time, so the navigator only shows rollups next to the pick list of the run that wrote them
+def write_rollups(paths, work_orders, overrides, picks, shortfalls, generated):
+    lines = rollup_lines(work_orders, overrides, picks, shortfalls)
+    for key, rollup in (('shortages', shortage_rollup(lines)), ('status', status_rollup(lines))):
+        write_arrow(rollup, paths[key], generated)
@@ -0,0 +1,205 @@
+import bisect
+import time
+
+import numpy as np
+import pandas as pd
+
+from .allocation import (allocate, build_events, build_override_index, build_substitute_index, override_levels,
+                         pool_event_index, prepare)
+from .export import output_paths
+from .pipeline import load
+from .rollups import line_status
+from .sources import load_excel
+from .state import load_state, overrides_digest
+
+# The columns that decide the rest of a pick row within one snapshot: the line and lot fields follow from the
+# line and the lot, and the allocation status from the quantities
+pick_key_columns = ['_phase', '_line', 'Source Site ID', 'Item ID', '_lot', 'Lot Qty to Pick', 'Total Qty to Pick',
+                    'Unfulfilled Qty', 'Scheduled Date']
+
+# Hash of each pick row, to compare pick lists of one snapshot without merging them
+def pick_hashes(picks):
+    return pd.util.hash_pandas_object(picks[pick_key_columns], index=False)
+
+# (key, original item) entries of each swap level whose substitute differs between two override indexes
+def changed_override_keys(override_index, other_override_index):
+    changed = {}
+    for level, _ in override_levels:
+        entries, other_entries = override_index[level], other_override_index[level]
+        changed[level] = {key for key in entries.keys() | other_entries.keys() if entries.get(key) != other_entries.get(key)}
+    return changed
+
+# Allocation scenarios against one loaded snapshot of prepared work orders and inventory, allocated once as the
+# base. Each scenario changes the swap list and/or reschedules work orders, and only the allocation events its
+# changes reach are run again: the base frames and allocation events are shared, not copied, only the changed
+# work orders' events are built again, and lot pools are only built for the pools the events to run touch, so
+# every scenario starts from untouched base data.
+class Scenarios:
+    def __init__(self, work_orders, inventory, overrides, picks=None, shortfalls=None):
+        self.work_orders = work_orders
+        self.inventory = inventory
+        self.overrides = overrides
+        if picks is None:
+            picks, shortfalls = allocate(work_orders, inventory, overrides)
+        self.picks = picks
+        self.shortfalls = shortfalls
+        self.override_index = build_override_index(overrides)
+        self.events = build_events(work_orders, self.override_index, build_substitute_index(work_orders))
+        self.pool_events = pool_event_index(self.events)
+        self.work_order_ids = set(work_orders['WORKORDER_ID'].tolist())
+        self.status = line_status(work_orders, picks, shortfalls)
+        self.pick_hashes = pick_hashes(picks)
+
+    # Work orders whose lines take a different substitute under override_index
+    def work_orders_with_new_substitutes(self, override_index):
+        changed = changed_override_keys(self.override_index, override_index)
+        if not any(changed.values()):
+            return set()
+        items = {item_id for level_changed in changed.values() for _, item_id in level_changed}
+        work_orders = self.work_orders[self.work_orders['COMP_ITEMID'].isin(items).to_numpy()]
+        return {
+            workorder_id
+            for workorder_id, batch_number, project_number, item_id in zip(
+                work_orders['WORKORDER_ID'].tolist(), work_orders['PROD_BATCH_NUM'].tolist(),
+                work_orders['PROJECT_NUMBER'].tolist(), work_orders['COMP_ITEMID'].tolist())
+            if (workorder_id, item_id) in changed['Work Order'] or (batch_number, item_id) in changed['Batch']
+            or (project_number, item_id) in changed['Project']
+        }
+
+    # Allocate one scenario: overrides replaces the swap list, and schedule maps work order IDs to their new
+    # SCHED_DATETIME. Returns the scenario's picks, the pick rows added and removed against the base, the lines
+    # whose allocation status changed (base and scenario columns side by side) and the seconds it took.
+    def run(self, overrides=None, schedule=None):
+        started = time.perf_counter()
+        overrides = self.overrides if overrides is None else overrides
+        schedule = {workorder_id: pd.Timestamp(sched) for workorder_id, sched in (schedule or {}).items()}
+
+        changed_work_orders = set(schedule) & self.work_order_ids
+        override_index = self.override_index
+        if overrides is not self.overrides:
+            override_index = build_override_index(overrides)
+            changed_work_orders |= self.work_orders_with_new_substitutes(override_index)
+
+        if changed_work_orders:
+            work_orders, removed_lines, changed_lines = self.rescheduled(changed_work_orders, schedule)
+            events, pool_events = self.changed_events(removed_lines, changed_lines, override_index)
+            state = {'work_orders': self.work_orders, 'inventory': self.inventory,
+                     'picks': self.picks, 'shortfalls': self.shortfalls}
+            picks, shortfalls = allocate(work_orders, self.inventory, overrides, removed_lines, state,
+                                         (set(), changed_work_orders), events=events, pool_events=pool_events)
+        else:
+            work_orders, picks, shortfalls = self.work_orders, self.picks, self.shortfalls
+
+        hashes = pick_hashes(picks) if picks is not self.picks else self.pick_hashes
+        added = ~hashes.isin(self.pick_hashes).to_numpy()
+        removed = ~self.pick_hashes.isin(hashes).to_numpy()
+        # A line's status follows from its quantity and its picks, so only lines with added or removed picks can
+        # change; scenarios keep the base's lines, only rescheduled or substituted
+        lines = set(picks['_line'][added].tolist()) | set(self.picks['_line'][removed].tolist())
+        status = line_status(work_orders[work_orders['LINE_ID'].isin(lines).to_numpy()],
+                             picks[picks['_line'].isin(lines).to_numpy()],
+                             shortfalls[shortfalls['LINE_ID'].isin(lines).to_numpy()])
+        base_status = self.status[self.status.index.isin(lines)]
+        status = status.reindex(base_status.index).astype(base_status.dtypes.to_dict())
+        status_changed = ((base_status['STATUS'] != status['STATUS']) |
+                          (base_status['UNFULFILLED'] != status['UNFULFILLED'])).to_numpy()
+        return {
+            'picks': picks,
+            'added': picks[added].reset_index(drop=True),
+            'removed': self.picks[removed].reset_index(drop=True),
+            'status': base_status[status_changed].add_suffix('_BASE').join(status[status_changed]).reset_index(),
+            'seconds': time.perf_counter() - started,
+        }
+
+    # The base events and their pool index with the removed lines' events replaced by the changed lines' ones;
+    # only the pools either may draw on get a new index entry
+    def changed_events(self, removed_lines, changed_lines, override_index):
+        events = dict(self.events)
+        removed_events = set()
+        for position in removed_lines.index.tolist():
+            for event in ((0, position), (1, position)):
+                if events.pop(event, None) is not None:
+                    removed_events.add(event)
+        new_events = build_events(changed_lines, override_index, build_substitute_index(changed_lines))
+        events.update(new_events)
+
+        pool_events = dict(self.pool_events)
+        changed_pools = {pool: [] for event in removed_events for pool in self.events[event][2]}
+        for event in sorted(new_events):
+            for pool in new_events[event][2]:
+                changed_pools.setdefault(pool, []).append(event)
+        for pool, pool_new_events in changed_pools.items():
+            kept = [event for event in self.pool_events.get(pool, []) if event not in removed_events]
+            pool_events[pool] = sorted(kept + pool_new_events)
+        return events, pool_events
+
+    # Run several scenarios, given by name as run() keyword arguments; returns their results by name
+    def compare(self, scenarios):
+        return {name: self.run(**scenario) for name, scenario in scenarios.items()}
+
+    # Work orders with changed_work_orders rescheduled and merged back in scheduled order, as prepare() merges
+    # changed work orders into a saved snapshot. The other lines keep their base positions and the changed lines
+    # are placed between them, so the base events and positions still hold. Returns the work orders, the changed
+    # lines at their old positions (the removed lines) and at their new ones.
+    def rescheduled(self, changed_work_orders, schedule):
+        work_orders = self.work_orders
+        changed = work_orders['WORKORDER_ID'].isin(changed_work_orders).to_numpy()
+        removed_lines = work_orders[changed]
+        positions = work_orders.index.to_numpy()
+        kept_positions = np.flatnonzero(~changed)
+
+        new_sched = removed_lines['WORKORDER_ID'].map(schedule)
+        changed_lines = removed_lines.assign(SCHED_DATETIME=new_sched.fillna(removed_lines['SCHED_DATETIME'])
+                                             .astype(work_orders['SCHED_DATETIME'].dtype))
+        # Lines scheduled together keep the order they were loaded in, which LINE_ID numbers
+        load_order = changed_lines['LINE_ID'].str.rsplit('/', n=1).str[1].astype(int).to_numpy()
+        sched = changed_lines['SCHED_DATETIME'].to_numpy()
+        workorder_ids = changed_lines['WORKORDER_ID'].tolist()
+        seq_nums = changed_lines['SEQ_NUM'].tolist()
+        order = sorted(range(len(changed_lines)),
+                       key=lambda line: (sched[line], workorder_ids[line], seq_nums[line], load_order[line]))
+
+        # Where each changed line sorts among the base lines, after those scheduled the same; the base is sorted
+        base_sched = work_orders['SCHED_DATETIME'].to_numpy()
+        base_workorder_ids = work_orders['WORKORDER_ID'].array
+        base_seq_nums = work_orders['SEQ_NUM'].array
+        following = {}
+        ties_by_sched = {}
+        for line in order:
+            if sched[line] not in ties_by_sched:
+                begin = np.searchsorted(base_sched, sched[line], 'left')
+                end = np.searchsorted(base_sched, sched[line], 'right')
+                ties_by_sched[sched[line]] = begin, list(zip(base_workorder_ids[begin:end], base_seq_nums[begin:end]))
+            begin, ties = ties_by_sched[sched[line]]
+            insert_at = begin + bisect.bisect_right(ties, (workorder_ids[line], seq_nums[line]))
+            # The first base line that stays, to insert before
+            following.setdefault(np.searchsorted(kept_positions, insert_at), []).append(line)
+
+        # Positions evenly spaced between the kept lines either side
+        new_positions = np.empty(len(changed_lines))
+        for kept, lines in following.items():
+            previous = positions[kept_positions[kept - 1]] if kept > 0 else positions[0] - 1
+            after = positions[kept_positions[kept]] if kept < len(kept_positions) else positions[-1] + 1
+            new_positions[lines] = previous + (after - previous) * np.arange(1, len(lines) + 1) / (len(lines) + 1)
+        changed_lines.index = new_positions
+
+        merged = pd.concat([work_orders[~changed], changed_lines])
+        merged.sort_index(inplace=True, kind='stable')
+        return merged, removed_lines, changed_lines
+
+# Scenarios over the state saved by the last run next to pick_list_file, so no database is queried. With a
+# source, or when there is no saved state or the swap list changed since, the data is loaded and allocated afresh.
+def load_scenarios(swap_list, pick_list_file=None, source=None):
+    state = load_state(output_paths(pick_list_file)['state_dir']) if pick_list_file and source is None else None
+    if state is not None:
+        overrides = load_excel(swap_list)
+        if state['overrides_digest'] == overrides_digest(overrides):
+            return Scenarios(state['work_orders'], state['inventory'], overrides, state['picks'], state['shortfalls'])
+        print("The swap list changed since the saved state, allocating the base afresh.")
+        return Scenarios(state['work_orders'], state['inventory'], overrides)
+
+    if source is None:
+        raise ValueError("A data source is needed when there is no saved state to start from")
+    work_orders, inventory, overrides, _, _ = load(source, swap_list)
+    work_orders, _, inventory, _ = prepare(work_orders, inventory)
+    return Scenarios(work_orders, inventory, overrides)
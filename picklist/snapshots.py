@@ -0,0 +1,55 @@
+import glob
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+# Snapshot files are named <query name>-<key>-<fetch time>.parquet, the fetch time by the database server's
+# clock. Their modification time is when they were fetched by the local clock, which their age is measured on, so
+# a server clock running ahead of or behind this machine's cannot keep a snapshot fresh or expire it early.
+snapshot_time_format = "%Y%m%dT%H%M%S"
+
+# Key of a query's result set: the database it runs on, its text, parameters and how its rows are filtered and typed
+def snapshot_key(database, query, params=(), dtypes=None, row_filter=None):
+    fields = [database, query, [str(param) for param in params], dtypes or {},
+              getattr(row_filter, '__qualname__', None)]
+    return hashlib.sha1(json.dumps(fields).encode()).hexdigest()[:16]
+
+# Local Parquet snapshots of query result sets, so repeated runs reuse recently fetched rows instead of querying
+# the database again. A snapshot is reused for max_age (a Timedelta); refresh always fetches again.
+class SnapshotCache:
+    def __init__(self, folder, max_age, refresh=False):
+        self.folder = folder
+        self.max_age = max_age
+        self.refresh = refresh
+
+    def files(self, query_name, key):
+        return sorted(glob.glob(os.path.join(glob.escape(self.folder), f"{query_name}-{key}-*.parquet")))
+
+    # The newest snapshot of a result set still within max_age, as (rows, fetch time), or None
+    def get(self, query_name, key):
+        if self.refresh:
+            return None
+        files = self.files(query_name, key)
+        if not files:
+            return None
+        if time.time() - os.path.getmtime(files[-1]) > self.max_age.total_seconds():
+            return None
+        fetched = pd.to_datetime(os.path.splitext(files[-1])[0].rsplit('-', 1)[1], format=snapshot_time_format)
+        return pd.read_parquet(files[-1]), fetched
+
+    # Save the rows fetched at fetched by the server's clock and at fetched_locally (a time.time()) by the local
+    # one, replacing older snapshots of the same result set
+    def put(self, query_name, key, rows, fetched, fetched_locally):
+        os.makedirs(self.folder, exist_ok=True)
+        old_files = self.files(query_name, key)
+        path = os.path.join(self.folder, f"{query_name}-{key}-{fetched.strftime(snapshot_time_format)}.parquet")
+        temp_path = path + ".tmp"
+        rows.to_parquet(temp_path, index=False)
+        os.utime(temp_path, (fetched_locally, fetched_locally))
+        os.replace(temp_path, path)
+        for old_file in old_files:
+            if old_file != path:
+                os.remove(old_file)
@@ -0,0 +1,276 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from .snapshots import snapshot_key
+
+# pyodbc is only needed to read from SQL Server
+try:
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+def load_query(filename):
+    with open(filename, 'r') as file:
+        return file.read()
+
+# Queries, by file name without the .sql extension
+work_orders_query_name = "work_orders_query"
+inventory_query_name = "inventory_query"
+
+# Delta queries for incremental runs. Each takes the previous run's watermark as its one parameter and
+# returns the current rows of every work order / (SITE_ID, ITEM_ID) pool that changed since then.
+work_orders_delta_query_name = "work_orders_delta_query"
+inventory_delta_query_name = "inventory_delta_query"
+
+# Changed-key queries for incremental runs, taking the same watermark. They return the WORKORDER_ID / (SITE_ID,
+# ITEM_ID) of everything that changed since then, deleted ones included: closed or removed work orders and pools
+# whose lots were consumed or moved away, which the delta queries cannot return rows for. A changed key with no
+# delta rows clears that work order or pool.
+work_orders_changed_keys_query_name = "work_orders_changed_keys_query"
+inventory_changed_keys_query_name = "inventory_changed_keys_query"
+
+# Current time on the database server, by connection type
+server_time_queries = {
+    'sqlite': "SELECT datetime('now', 'localtime')",
+    'sql server': "SELECT SYSDATETIME()",
+}
+
+# Set up the connection string with Windows Authentication
+conn_str = (
+    r'DRIVER={ODBC Driver 17 for SQL Server};'
+    r'SERVER=ddur-sql03\WWEST;'
+    r'DATABASE=FDW;'
+    r'Trusted_Connection=yes;'
+)
+
+# Load data with error handling
+def load_excel(file_path):
+    if not os.path.exists(file_path):
+        print(f"Error: File {file_path} not found.")
+        return pd.DataFrame()
+    try:
+        return pd.read_excel(file_path)
+    except Exception as e:
+        print(f"Error loading {file_path}: {e}")
+        return pd.DataFrame()
+
+# Column types assigned as rows are read
+work_order_dtypes = {
+    'SITE_ID': 'category',
+    'CUSTOM_DATA1': 'category',
+    'SCHED_DATETIME': 'datetime64[ns]',
+}
+inventory_dtypes = {
+    'SITE_ID': 'category',
+    'CUSTOM_DATA1': 'category',
+    'ITEM_ID': 'int32',
+    'EXPDATE': 'datetime64[ns]',
+}
+inventory_key_dtypes = {
+    'SITE_ID': 'category',
+    'ITEM_ID': 'int32',
+}
+
+# Filter inventory based on CUSTOM_DATA1(Location Category) values
+valid_location_categories = ["CMF Warehouse", "CMF Warehouse - Cold", "W1", "W2", "W3", "W4"]
+
+# Inventory rows the allocation may draw on
+def inventory_filter(inventory):
+    keep = inventory['CUSTOM_DATA1'].isin(valid_location_categories)
+
+    # Apply additional filtering logic
+    if 'BOM_CUSTOM_DATA1' in inventory.columns and 'CUSTOM_DATA1' in inventory.columns and 'ITEM_ID' in inventory.columns:
+        keep &= (
+            (inventory['BOM_CUSTOM_DATA1'] != 'MFG Only') &  # Exclude 'MFG Only'
+            ~((inventory['CUSTOM_DATA1'] == 'Downstream') & (inventory['ITEM_ID'].astype(str).str.startswith(('1', '7'))))  # Exclude Downstream + 1/7
+        )
+    return keep
+
+# Convert a batch's columns to their compact types; rows whose integer columns do not parse are dropped
+def apply_dtypes(frame, dtypes):
+    for column, dtype in dtypes.items():
+        if dtype == 'category':
+            values = frame[column].astype('category')
+        elif dtype.startswith('datetime64'):
+            values = pd.to_datetime(frame[column], errors='coerce').astype(dtype)
+        else:
+            values = pd.to_numeric(frame[column], errors='coerce')
+            frame, values = frame[values.notna()], values[values.notna()].astype(dtype)
+        frame = frame.assign(**{column: values})
+    return frame
+
+# Combine batches of raw rows, filtering and typing each batch as it arrives,
+# so only the kept rows are ever held rather than the whole raw result set
+def read_batches(batches, columns, dtypes, row_filter=None):
+    kept = []
+    for batch in batches:
+        if row_filter is not None:
+            batch = batch[row_filter(batch)]
+        kept.append(apply_dtypes(batch, dtypes))
+
+    if not kept:
+        return apply_dtypes(pd.DataFrame(columns=columns), dtypes)
+
+    # Batches only share a categorical dtype once they share its categories
+    for column, dtype in dtypes.items():
+        if dtype == 'category':
+            categories = pd.api.types.union_categoricals([batch[column] for batch in kept]).categories
+            for batch in kept:
+                batch[column] = batch[column].cat.set_categories(categories)
+    return pd.concat(kept, ignore_index=True)
+
+# Stream a query's rows in batches of batch_size with cursor.fetchmany
+def read_query(cursor, query, dtypes, params=(), row_filter=None, batch_size=50000):
+    cursor.execute(query, params)
+    columns = [column[0] for column in cursor.description]
+
+    def fetch():
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns, coerce_float=True)
+
+    return read_batches(fetch(), columns, dtypes, row_filter)
+
+# Columns that come back from SQL as numbers; everything else in a CSV stand-in is read as text
+csv_numeric_columns = ['QTY', 'QTYTOTAL', 'SEQ_NUM']
+
+# Stream a CSV stand-in for a query's result set in batches of batch_size
+def read_csv(path, dtypes, row_filter=None, batch_size=50000):
+    columns = list(pd.read_csv(path, nrows=0).columns)
+    numeric_columns = [column for column in csv_numeric_columns if column in columns]
+
+    def fetch():
+        for batch in pd.read_csv(path, dtype=str, chunksize=batch_size):
+            for column in numeric_columns:
+                batch[column] = pd.to_numeric(batch[column], errors='coerce')
+            yield batch
+
+    return read_batches(fetch(), columns, dtypes, row_filter)
+
+# Where query rows come from: SQL Server (the .sql files in query_dir), a SQLite database running the same
+# files, or <query name>.csv stand-ins in csv_dir. With a SnapshotCache, full query results are reused from
+# local snapshots while they are fresh; fetched holds when each query's last loaded rows were read from the
+# database, by the server's clock.
+class DataSource:
+    def __init__(self, query_dir=None, sqlite=None, csv_dir=None, batch_size=50000, connection_string=conn_str,
+                 snapshots=None):
+        self.query_dir = query_dir
+        self.sqlite = sqlite
+        self.csv_dir = csv_dir
+        self.batch_size = batch_size
+        self.connection_string = connection_string
+        self.snapshots = snapshots
+        self.fetched = {}
+
+    @property
+    def name(self):
+        return 'csv' if self.csv_dir else ('sqlite' if self.sqlite else 'sql server')
+
+    # Open a connection to the configured database
+    def connect(self):
+        if self.sqlite:
+            return sqlite3.connect(self.sqlite)
+        if pyodbc is None:
+            raise RuntimeError("pyodbc is required to read from SQL Server")
+        return pyodbc.connect(self.connection_string)
+
+    # Load one query's rows, from a fresh snapshot or else on a connection of its own. Delta queries, which
+    # take parameters, always go to the database.
+    def load(self, query_name, dtypes, params=(), row_filter=None):
+        if self.csv_dir:
+            return read_csv(os.path.join(self.csv_dir, f"{query_name}.csv"), dtypes, row_filter, self.batch_size)
+
+        query = load_query(os.path.join(self.query_dir, f"{query_name}.sql"))
+        use_snapshots = self.snapshots is not None and not params
+        if use_snapshots:
+            key = snapshot_key(self.sqlite or self.connection_string, query, params, dtypes, row_filter)
+            snapshot = self.snapshots.get(query_name, key)
+            if snapshot is not None:
+                rows, self.fetched[query_name] = snapshot
+                print(f"{query_name}: using the snapshot fetched at {self.fetched[query_name]:%Y-%m-%d %H:%M:%S}")
+                return rows
+
+        fetched_locally = time.time()
+        rows, fetched = self.query(query, dtypes, params, row_filter)
+        self.fetched[query_name] = fetched
+        if use_snapshots:
+            self.snapshots.put(query_name, key, rows, fetched, fetched_locally)
+        return rows
+
+    # Run a query on a connection of its own; returns its rows and the server time just before it ran
+    def query(self, query, dtypes, params=(), row_filter=None):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                fetched = self.read_server_time(cursor)
+                return read_query(cursor, query, dtypes, params, row_filter, self.batch_size), fetched
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def read_server_time(self, cursor):
+        cursor.execute(server_time_queries[self.name])
+        return pd.Timestamp(cursor.fetchone()[0])
+
+    # Current time by the database server's clock, so a watermark taken from it cannot skip changes made
+    # while this machine's clock runs ahead. CSV stand-ins have no server and use the local clock.
+    def server_time(self):
+        if self.csv_dir:
+            return pd.Timestamp.now()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            try:
+                return self.read_server_time(cursor)
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+# Run a load, reporting how long it took and whether it failed
+def timed_load(name, load):
+    started = time.perf_counter()
+    try:
+        result = load()
+    except Exception as e:
+        print(f"{name}: failed after {time.perf_counter() - started:.1f}s: {e}")
+        raise
+    print(f"{name}: {len(result)} rows in {time.perf_counter() - started:.1f}s")
+    return result
+
+# Run independent loads concurrently, so the wall time is that of the slowest one
+def load_concurrently(loads):
+    with ThreadPoolExecutor(max_workers=len(loads)) as executor:
+        futures = {name: executor.submit(timed_load, name, load) for name, load in loads.items()}
+        wait(futures.values())
+
+    failed = [name for name, future in futures.items() if future.exception() is not None]
+    if failed:
+        raise RuntimeError(f"Could not load {', '.join(failed)}")
+    return {name: future.result() for name, future in futures.items()}
+
+# Loads of the full work order and inventory data
+def full_loads(source):
+    return {
+        'Work orders': lambda: source.load(work_orders_query_name, work_order_dtypes),
+        'Inventory': lambda: source.load(inventory_query_name, inventory_dtypes, row_filter=inventory_filter),
+    }
+
+# Loads of the work orders and inventory pools changed since watermark, and of the changed keys, deleted
+# ones included; delta rows are kept unfiltered until the pools they change are known
+def delta_loads(source, watermark):
+    params = [watermark.to_pydatetime()]
+    return {
+        'Work order changes': lambda: source.load(work_orders_delta_query_name, work_order_dtypes, params),
+        'Inventory changes': lambda: source.load(inventory_delta_query_name, inventory_dtypes, params),
+        'Changed work orders': lambda: source.load(work_orders_changed_keys_query_name, {}, params),
+        'Changed pools': lambda: source.load(inventory_changed_keys_query_name, inventory_key_dtypes, params),
+    }
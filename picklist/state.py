@@ -0,0 +1,40 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Load the state saved by the previous run, or None if there is none
+def load_state(state_dir):
+    state_file = os.path.join(state_dir, "state.json")
+    if not os.path.exists(state_file):
+        print(f"No saved state in {state_dir}, running a full allocation.")
+        return None
+    with open(state_file, 'r') as file:
+        state = json.load(file)
+    state['watermark'] = pd.Timestamp(state['watermark'])
+    for name in ('work_orders', 'inventory', 'picks', 'shortfalls'):
+        state[name] = pd.read_parquet(os.path.join(state_dir, f"{name}.parquet"))
+    return state
+
+# Save the allocation state and the data it was allocated from for the next incremental run
+def save_state(state_dir, watermark, overrides_digest, work_orders, inventory, picks, shortfalls):
+    os.makedirs(state_dir, exist_ok=True)
+    state_file = os.path.join(state_dir, "state.json")
+    if os.path.exists(state_file):
+        os.remove(state_file)
+    work_orders.to_parquet(os.path.join(state_dir, "work_orders.parquet"), index=False)
+    inventory.to_parquet(os.path.join(state_dir, "inventory.parquet"), index=False)
+    picks.to_parquet(os.path.join(state_dir, "picks.parquet"), index=False)
+    shortfalls.to_parquet(os.path.join(state_dir, "shortfalls.parquet"), index=False)
+    # Written last so a partly saved state is never picked up
+    with open(state_file, 'w') as file:
+        json.dump({'watermark': watermark.isoformat(), 'overrides_digest': overrides_digest}, file)
+
+# Fingerprint of the swap list columns that drive substitutions
+def overrides_digest(overrides):
+    columns = [column for column in ('Swap Level', 'Work Order ID', 'Production Batch Number', 'Project Number',
+                                     'Original KBI Item Number', 'Substitute KBI Item Number')
+               if column in overrides.columns]
+    hashes = pd.util.hash_pandas_object(overrides[columns], index=False) if columns else pd.Series([], dtype='uint64')
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The tests import the picklist package and the benchmark's data generators from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+# A small seeded data set from the benchmark's generators, stocked short often enough that lines compete for lots
+@pytest.fixture
+def data_set():
+    rng = np.random.default_rng(7)
+    work_orders = benchmark.make_work_orders(rng, 3000, 300, 3)
+    inventory = benchmark.make_inventory(rng, work_orders, 300, 4, 3, 0.3)
+    overrides = benchmark.make_overrides(rng, work_orders, 300, 0.05)
+    return work_orders, inventory, overrides
@@ -0,0 +1,78 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from picklist import allocate, prepare
+from picklist.allocation import build_override_index, get_substitute, line_pools
+from picklist.sources import apply_dtypes, inventory_dtypes, inventory_filter, work_order_dtypes
+
+# The data set typed and filtered as the sources load it, then prepared for allocation
+def prepared(data_set):
+    work_orders, inventory, overrides = data_set
+    work_orders = apply_dtypes(work_orders.copy(), work_order_dtypes)
+    inventory = apply_dtypes(inventory[inventory_filter(inventory)], inventory_dtypes)
+    work_orders, _, inventory, _ = prepare(work_orders, inventory)
+    return work_orders, inventory, overrides
+
+# Allocation written as the plain greedy loop it implements: every primary line in scheduled order takes its
+# item (after swaps) from its pools' lots earliest expiry first, then every line still short takes the rest from
+# its substitute line's item in the same order. Returns the picks as (phase, line, site, item, lot, qty) tuples.
+def reference_allocation(work_orders, inventory, overrides):
+    lots = {}
+    for site_id, item_id, lot_id, qty in zip(inventory['SITE_ID'].tolist(), inventory['ITEM_ID'].tolist(),
+                                             inventory['LOTID'].tolist(), inventory['QTYTOTAL'].tolist()):
+        lots.setdefault((site_id, item_id), []).append([lot_id, qty])
+    override_index = build_override_index(overrides)
+    substitutes = {}
+    for row in work_orders[work_orders['ORIG_CODE'] == 'S'].itertuples():
+        substitutes.setdefault((row.WORKORDER_ID, row.SEQ_NUM), row.COMP_ITEMID)
+
+    picks = []
+
+    def draw(row, item_id, qty_needed, phase):
+        for pool in line_pools(row.SITE_ID, item_id):
+            for lot in lots.get(pool, []):
+                if qty_needed <= 0:
+                    break
+                qty = min(lot[1], qty_needed)
+                if qty > 0:
+                    lot[1] -= qty
+                    qty_needed -= qty
+                    picks.append((phase, row.LINE_ID, pool[0], item_id, lot[0], qty))
+        return qty_needed
+
+    lines = list(work_orders[work_orders['ORIG_CODE'] != 'S'].itertuples())
+    shortfalls = {}
+    items = {}
+    for row in lines:
+        items[row.LINE_ID] = get_substitute(override_index, row.COMP_ITEMID, row.WORKORDER_ID, row.PROJECT_NUMBER,
+                                            row.PROD_BATCH_NUM)
+        shortfalls[row.LINE_ID] = draw(row, items[row.LINE_ID], row.QTY, 0)
+    for row in lines:
+        substitute_item = substitutes.get((row.WORKORDER_ID, row.SEQ_NUM))
+        if shortfalls[row.LINE_ID] > 0 and substitute_item is not None and substitute_item != items[row.LINE_ID]:
+            draw(row, substitute_item, shortfalls[row.LINE_ID], 1)
+    return picks, shortfalls
+
+def test_allocate_matches_reference(data_set):
+    work_orders, inventory, overrides = prepared(data_set)
+    picks, shortfalls = allocate(work_orders, inventory, overrides)
+    reference_picks, reference_shortfalls = reference_allocation(work_orders, inventory, overrides)
+
+    columns = ['_phase', '_line', 'Source Site ID', 'Item ID', 'Lot ID', 'Lot Qty to Pick']
+    pd.testing.assert_frame_equal(picks[columns].reset_index(drop=True), pd.DataFrame(reference_picks, columns=columns),
+                                  check_dtype=False)
+    assert (picks['_phase'] == 1).any()
+    shortfalls_by_line = dict(zip(shortfalls['LINE_ID'].tolist(), shortfalls['SHORTFALL'].tolist()))
+    assert {line_id: shortfalls_by_line[line_id] for line_id in reference_shortfalls} == pytest.approx(reference_shortfalls)
+
+@pytest.mark.parametrize('start_method', [None, 'forkserver'])
+def test_workers_match_single_process(data_set, start_method):
+    work_orders, inventory, overrides = prepared(data_set)
+    picks, shortfalls = allocate(work_orders, inventory, overrides)
+    mp_context = multiprocessing.get_context(start_method) if start_method else None
+    parallel_picks, parallel_shortfalls = allocate(work_orders, inventory, overrides, workers=4, mp_context=mp_context)
+
+    pd.testing.assert_frame_equal(parallel_picks, picks)
+    pd.testing.assert_frame_equal(parallel_shortfalls, shortfalls)
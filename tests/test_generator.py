@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+import benchmark
+
+# The generator run from its script on CSV stand-ins, in a process where importing pyodbc fails as it does on
+# machines without the SQL Server driver. The script's folder is the working directory, so the package imports.
+def test_offline_run_without_pyodbc(tmp_path):
+    swap_list, _ = benchmark.write_data_set(str(tmp_path), 2000, 200, 4, 3, 0.05, 0.3, seed=3)
+    pick_list_file = str(tmp_path / "out" / "Pick List.xlsx")
+    os.makedirs(os.path.dirname(pick_list_file))
+    code = ("import runpy, sys; sys.modules['pyodbc'] = None; sys.argv = sys.argv[1:]; "
+            "runpy.run_path(sys.argv[0], run_name='__main__')")
+    subprocess.run([sys.executable, "-c", code, benchmark.generator_script, "--csv-dir", str(tmp_path),
+                    "--swap-list", swap_list, "--pick-list", pick_list_file, "--no-xlsx"],
+                   check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(benchmark.generator_script))
+
+    assert os.path.exists(str(tmp_path / "out" / "Pick List.arrow"))
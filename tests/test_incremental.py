@@ -0,0 +1,90 @@
+import os
+
+import pandas as pd
+
+from picklist import DataSource, run
+from picklist.allocation import pick_list_columns
+
+# Write a data set as the CSV stand-ins of the full queries
+def write_full(folder, work_orders, inventory):
+    os.makedirs(folder, exist_ok=True)
+    work_orders.to_csv(os.path.join(folder, "work_orders_query.csv"), index=False)
+    inventory.to_csv(os.path.join(folder, "inventory_query.csv"), index=False)
+
+# Write the delta and changed-key query stand-ins for the changed work orders and pools of a data set
+def write_delta(folder, work_orders, inventory, changed_work_orders, changed_pools):
+    os.makedirs(folder, exist_ok=True)
+    pools = pd.Series(list(zip(inventory['SITE_ID'], inventory['ITEM_ID'])))
+    work_orders[work_orders['WORKORDER_ID'].isin(changed_work_orders)].to_csv(
+        os.path.join(folder, "work_orders_delta_query.csv"), index=False)
+    inventory[pools.isin(changed_pools).to_numpy()].to_csv(os.path.join(folder, "inventory_delta_query.csv"), index=False)
+    pd.DataFrame({'WORKORDER_ID': sorted(changed_work_orders)}).to_csv(
+        os.path.join(folder, "work_orders_changed_keys_query.csv"), index=False)
+    pd.DataFrame(sorted(changed_pools), columns=['SITE_ID', 'ITEM_ID']).to_csv(
+        os.path.join(folder, "inventory_changed_keys_query.csv"), index=False)
+
+# Run a full allocation of the data set in folder; returns the picks
+def full_run(tmp_path, name, work_orders, inventory, swap_list):
+    folder = str(tmp_path / name)
+    write_full(folder, work_orders, inventory)
+    state = run(DataSource(None, csv_dir=folder), swap_list, os.path.join(folder, "Pick List.xlsx"), xlsx=False)
+    return state['picks']
+
+# Allocate the base data set in full, then the changed one incrementally from the saved state and in full, and
+# check both give the same pick list
+def check_incremental(tmp_path, data_set, work_orders, inventory, changed_work_orders, changed_pools):
+    base_work_orders, base_inventory, overrides = data_set
+    swap_list = str(tmp_path / "Swaps.xlsx")
+    overrides.to_excel(swap_list, index=False)
+
+    folder = str(tmp_path / "incremental")
+    write_full(folder, base_work_orders, base_inventory)
+    pick_list_file = os.path.join(folder, "Pick List.xlsx")
+    run(DataSource(None, csv_dir=folder), swap_list, pick_list_file, xlsx=False)
+    write_full(folder, work_orders, inventory)
+    write_delta(folder, work_orders, inventory, changed_work_orders, changed_pools)
+    state = run(DataSource(None, csv_dir=folder), swap_list, pick_list_file, incremental=True, xlsx=False)
+
+    full_picks = full_run(tmp_path, "full", work_orders, inventory, swap_list)
+    pd.testing.assert_frame_equal(state['picks'][pick_list_columns].reset_index(drop=True),
+                                  full_picks[pick_list_columns].reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+# Pools whose lots were picked in a full run of the data set, in pick order
+def picked_pools(inventory, picks):
+    pools = list(dict.fromkeys(zip(picks['Source Site ID'].tolist(), picks['Item ID'].astype(str).tolist())))
+    return [pool for pool in pools if ((inventory['SITE_ID'] == pool[0]) & (inventory['ITEM_ID'] == pool[1])).any()]
+
+def test_changed_work_orders_and_pools(tmp_path, data_set):
+    work_orders, inventory, _ = data_set
+    work_order_ids = work_orders['WORKORDER_ID'].unique()
+    changed_work_orders = set(work_order_ids[::25])
+    changed = work_orders['WORKORDER_ID'].isin(changed_work_orders)
+    work_orders = work_orders.assign(
+        SCHED_DATETIME=work_orders['SCHED_DATETIME'].where(~changed, "2025-03-02 06:00:00"),
+        QTY=work_orders['QTY'].where(~changed, work_orders['QTY'] * 3))
+
+    changed_pools = set(list(zip(inventory['SITE_ID'], inventory['ITEM_ID']))[::40])
+    pools = pd.Series(list(zip(inventory['SITE_ID'], inventory['ITEM_ID']))).isin(changed_pools).to_numpy()
+    inventory = inventory.assign(QTYTOTAL=inventory['QTYTOTAL'].where(~pools, inventory['QTYTOTAL'] / 2))
+
+    check_incremental(tmp_path, data_set, work_orders, inventory, changed_work_orders, changed_pools)
+
+def test_deleted_work_orders(tmp_path, data_set):
+    work_orders, inventory, _ = data_set
+    deleted_work_orders = set(work_orders['WORKORDER_ID'].unique()[::10])
+    work_orders = work_orders[~work_orders['WORKORDER_ID'].isin(deleted_work_orders)]
+
+    check_incremental(tmp_path, data_set, work_orders, inventory, deleted_work_orders, set())
+
+def test_emptied_pools(tmp_path, data_set):
+    work_orders, inventory, overrides = data_set
+    swap_list = str(tmp_path / "Swaps.xlsx")
+    overrides.to_excel(swap_list, index=False)
+    picks = full_run(tmp_path, "base", work_orders, inventory, swap_list)
+
+    emptied_pools = set(picked_pools(inventory, picks)[::5])
+    emptied = pd.Series(list(zip(inventory['SITE_ID'], inventory['ITEM_ID']))).isin(emptied_pools).to_numpy()
+    inventory = inventory[~emptied]
+
+    check_incremental(tmp_path, data_set, work_orders, inventory, set(), emptied_pools)
@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+import pytest
+
+import pick_tickets
+
+# Pick rows of one work order, with its item described as description
+def ticket_rows(work_order_id, description):
+    return pd.DataFrame([{
+        "Project Number": "P003", "Batch ID": "B0179", "Production ID": "BR-52", "Custom Data": "Upstream",
+        "BoM Custom Data": "", "Work Order ID": work_order_id, "Item ID": "100102", "Original/Substitute": "O",
+        "Total Qty to Pick": 12.0, "Lot Qty to Pick": 12.0, "Lot ID": "L0001", "Location ID": "A-01",
+        "Expiration Date": "03-31-2026", "Item Description": description, "Stock UoM": "EA",
+        "Source Site ID": "1", "Target Site ID": "1", "Scheduled Date": "2025-03-05 06:00:00",
+        "Unfulfilled Qty": 0.0, "Allocation Status": "Fully Allocated",
+    }])
+
+# The DejaVu fonts shipped at the repository root, registered afresh for each test
+@pytest.fixture
+def fonts(monkeypatch):
+    monkeypatch.setattr(pick_tickets, "font_dir", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    pick_tickets.pdf_template.cache_clear()
+    yield
+    pick_tickets.pdf_template.cache_clear()
+
+def test_tickets_rendered_one_after_another(fonts):
+    first = pick_tickets.generate_pdf("Boulder", "00100010", ticket_rows("00100010", "Sterile water"))
+    # Glyphs the first ticket did not use must still be in the font for the next one
+    second = pick_tickets.generate_pdf("Boulder", "00100020", ticket_rows("00100020", "Sérum bovin ≥ 5 µg/mL Ω"))
+
+    assert first.startswith(b"%PDF") and second.startswith(b"%PDF")
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from picklist import Scenarios, allocate
+from picklist.allocation import pick_list_columns, state_columns
+from picklist.rollups import line_status
+from test_allocation import prepared
+
+# Pick rows as tuples, to compare pick lists as sets
+def pick_rows(picks):
+    return set(picks[pick_list_columns + state_columns].itertuples(index=False, name=None))
+
+def test_scenario_matches_full_allocation(data_set):
+    work_orders, inventory, overrides = prepared(data_set)
+    scenarios = Scenarios(work_orders, inventory, overrides)
+    # Reschedule some work orders to the front, some to the back and one to where it already is, and drop half the
+    # swap list so other work orders take different items
+    work_order_ids = work_orders['WORKORDER_ID'].unique()
+    schedule = {workorder_id: '2025-03-02 06:00:00' for workorder_id in work_order_ids[::40]}
+    schedule.update({workorder_id: '2025-04-30 18:00:00' for workorder_id in work_order_ids[7::40]})
+    first_line = work_orders.iloc[0]
+    schedule[first_line['WORKORDER_ID']] = str(first_line['SCHED_DATETIME'])
+    swaps = overrides.iloc[len(overrides) // 2:]
+    result = scenarios.run(swaps, schedule)
+
+    base_work_orders, base_inventory, _ = data_set
+    new_sched = base_work_orders['WORKORDER_ID'].map(schedule)
+    changed_work_orders = base_work_orders.assign(SCHED_DATETIME=new_sched.fillna(base_work_orders['SCHED_DATETIME']))
+    full_work_orders, full_inventory, _ = prepared((changed_work_orders, base_inventory, swaps))
+    full_picks, full_shortfalls = allocate(full_work_orders, full_inventory, swaps)
+    pd.testing.assert_frame_equal(result['picks'].reset_index(drop=True), full_picks.reset_index(drop=True),
+                                  check_dtype=False)
+
+    base_rows, scenario_rows = pick_rows(scenarios.picks), pick_rows(full_picks)
+    assert result['added'].shape[0] > 0 and result['removed'].shape[0] > 0
+    assert pick_rows(result['added']) == scenario_rows - base_rows
+    assert pick_rows(result['removed']) == base_rows - scenario_rows
+
+    base_status = scenarios.status
+    full_status = line_status(full_work_orders, full_picks, full_shortfalls).reindex(base_status.index)
+    changed = (base_status['STATUS'] != full_status['STATUS']) | (base_status['UNFULFILLED'] != full_status['UNFULFILLED'])
+    assert changed.any()
+    assert result['status']['LINE_ID'].tolist() == base_status.index[changed.to_numpy()].tolist()
+    assert (result['status']['STATUS'] != result['status']['STATUS_BASE']).any()
+
+def test_unchanged_scenario_is_the_base(data_set):
+    work_orders, inventory, overrides = prepared(data_set)
+    scenarios = Scenarios(work_orders, inventory, overrides)
+    result = scenarios.run(schedule={'no such work order': '2025-03-02 06:00:00'})
+
+    assert result['picks'] is scenarios.picks
+    assert result['added'].empty and result['removed'].empty and result['status'].empty
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from picklist import DataSource, SnapshotCache
+
+# A SQLite database with one table of lots and a query directory with one query reading it
+def lots_database(tmp_path, qty):
+    database = str(tmp_path / "lots.db")
+    with sqlite3.connect(database) as conn:
+        conn.execute("DROP TABLE IF EXISTS lots")
+        conn.execute("CREATE TABLE lots (LOTID TEXT, QTYTOTAL REAL)")
+        conn.executemany("INSERT INTO lots VALUES (?, ?)", [("L1", qty), ("L2", qty * 2)])
+    (tmp_path / "lots_query.sql").write_text("SELECT LOTID, QTYTOTAL FROM lots")
+    return database
+
+def test_snapshot_reused_until_it_expires(tmp_path):
+    snapshots = SnapshotCache(str(tmp_path / "snapshots"), pd.Timedelta(minutes=10))
+    source = DataSource(str(tmp_path), sqlite=lots_database(tmp_path, 5), snapshots=snapshots)
+    first = source.load("lots_query", {'QTYTOTAL': 'float64'})
+    fetched = source.fetched["lots_query"]
+
+    # Changed rows are not seen while the snapshot is fresh
+    lots_database(tmp_path, 7)
+    reused = source.load("lots_query", {'QTYTOTAL': 'float64'})
+    pd.testing.assert_frame_equal(reused, first)
+    assert source.fetched["lots_query"] == fetched
+
+    # Once it is older than max_age, the query runs again and its snapshot replaces the old one
+    [snapshot_file] = snapshots.files("lots_query", "*")
+    expired = time.time() - 11 * 60
+    os.utime(snapshot_file, (expired, expired))
+    assert source.load("lots_query", {'QTYTOTAL': 'float64'})['QTYTOTAL'].tolist() == [7, 14]
+    assert len(snapshots.files("lots_query", "*")) == 1
+
+    # A refresh queries again however fresh the snapshot is
+    refreshing = SnapshotCache(snapshots.folder, snapshots.max_age, refresh=True)
+    source = DataSource(str(tmp_path), sqlite=lots_database(tmp_path, 9), snapshots=refreshing)
+    assert source.load("lots_query", {'QTYTOTAL': 'float64'})['QTYTOTAL'].tolist() == [9, 18]
+
+def test_snapshot_age_ignores_the_server_clock(tmp_path):
+    snapshots = SnapshotCache(str(tmp_path), pd.Timedelta(hours=1))
+    rows = pd.DataFrame({'LOTID': ["L1"], 'QTYTOTAL': [5.0]})
+
+    # Fetched just now by a server clock hours behind: still fresh, with the server's fetch time
+    server_behind = pd.Timestamp.now().floor('s') - pd.Timedelta(hours=5)
+    snapshots.put("behind", "key", rows, server_behind, time.time())
+    reused_rows, fetched = snapshots.get("behind", "key")
+    pd.testing.assert_frame_equal(reused_rows, rows)
+    assert fetched == server_behind
+
+    # Fetched two hours ago by a server clock hours ahead: expired
+    snapshots.put("ahead", "key", rows, pd.Timestamp.now() + pd.Timedelta(hours=5), time.time() - 2 * 3600)
+    assert snapshots.get("ahead", "key") is None
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from work_order_search import WorkOrderSearch
+
+# Pick rows of four work orders over two sites, one or two picks each
+@pytest.fixture
+def search():
+    pick_list = pd.DataFrame([
+        ("1", "00100010", "P003", "B0179", "BR-52", "100102", "2025-03-05 06:00"),
+        ("1", "00100010", "P003", "B0179", "BR-52", "100093", "2025-03-05 06:00"),
+        ("1", "00100020", "P010", "B0200", "BR-10", "100010", "2025-03-03 13:00"),
+        ("2", "00100030", "P003", "B0300", "BR-30", "200102", "2025-03-04 09:00"),
+        ("1", "00100040", "P030", "B0031", "XP-03", "300300", "2025-03-10 18:00"),
+    ], columns=["Target Site ID", "Work Order ID", "Project Number", "Batch ID", "Production ID", "Item ID",
+                "Scheduled Date"])
+    return WorkOrderSearch(pick_list)
+
+def ranks_by_work_order(search, query):
+    return {work_order_id: rank for (_, work_order_id), rank in zip(search.keys, search.ranks(query).tolist())}
+
+def test_ranks_exact_prefix_and_substring(search):
+    assert ranks_by_work_order(search, "p003") == {"00100010": 0, "00100020": 3, "00100030": 0, "00100040": 3}
+    assert ranks_by_work_order(search, "p0") == {"00100010": 1, "00100020": 1, "00100030": 1, "00100040": 1}
+    # An item on one pick is enough, and the best match of a work order's terms counts
+    assert ranks_by_work_order(search, "0102") == {"00100010": 2, "00100020": 3, "00100030": 2, "00100040": 3}
+    assert ranks_by_work_order(search, "100093") == {"00100010": 0, "00100020": 3, "00100030": 3, "00100040": 3}
+    assert ranks_by_work_order(search, "b03") == {"00100010": 3, "00100020": 3, "00100030": 1, "00100040": 3}
+    assert ranks_by_work_order(search, "30") == {"00100010": 3, "00100020": 3, "00100030": 2, "00100040": 1}
+    assert ranks_by_work_order(search, "") == {"00100010": 0, "00100020": 0, "00100030": 0, "00100040": 0}
+
+def test_single_characters_only_match_as_prefixes(search):
+    assert ranks_by_work_order(search, "x") == {"00100010": 3, "00100020": 3, "00100030": 3, "00100040": 1}
+    assert ranks_by_work_order(search, "3") == {"00100010": 3, "00100020": 3, "00100030": 3, "00100040": 1}
+
+def test_search_ranks_then_orders_by_scheduled_date(search):
+    assert search.search(" P0 ") == [("1", "00100020"), ("2", "00100030"), ("1", "00100010"), ("1", "00100040")]
+    assert search.search("p0", limit=2) == [("1", "00100020"), ("2", "00100030")]
+    assert search.search("30") == [("1", "00100040"), ("2", "00100030")]
+    assert search.search("nothing") == []
+
+def test_search_filters_by_site_and_scheduled_dates(search):
+    assert search.search("p0", site_id=1) == [("1", "00100020"), ("1", "00100010"), ("1", "00100040")]
+    # Both ends are whole days and inclusive
+    assert search.search("p0", start=pd.Timestamp("2025-03-04").date(), end=pd.Timestamp("2025-03-05").date()) == [
+        ("2", "00100030"), ("1", "00100010")]
+    assert search.search("", site_id="1", start="2025-03-05") == [("1", "00100010"), ("1", "00100040")]
+    assert search.search("", site_id="2", end="2025-03-03") == []
+    assert search.label(("1", "00100020")) == "00100020 · P010 · B0200 · 2025-03-03"
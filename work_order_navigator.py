@@ -1,16 +1,48 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
 import math
+import multiprocessing
 from datetime import datetime
-from collections import defaultdict
+from pick_tickets import generate_pdf, render_batch, site_texts
+from pick_list_watcher import PickListWatcher
 
 st.set_page_config(layout="wide", page_title="Production Pick List", initial_sidebar_state="expanded")
 
-# Load data
-pick_list = pd.read_excel("/workspaces/picklistapp/Pick List.xlsx")
-pick_list["Work Order ID"] = pick_list["Work Order ID"].astype(str).str.zfill(8)
-pick_list["Expiration Date"] = pick_list["Expiration Date"].dt.strftime("%m-%d-%Y")
+# One watcher for the app process: it loads the published pick list (preferring the memory-mapped Arrow file)
+# and every new version in the background, once, however many sessions are open
+@st.cache_resource(show_spinner="Loading pick list...")
+def pick_list_watcher():
+    return PickListWatcher().start()
+
+# Each rerun uses the version loaded last, whole, even if a newer one is swapped in meanwhile. Until a pick list
+# is published and loads, every rerun says so and tries again.
+try:
+    watcher = pick_list_watcher()
+except Exception as e:
+    st.error(f"❌ The pick list could not be loaded: {e}")
+    st.stop()
+pick_list_version = watcher.current
+st.session_state['pick_list_version'] = pick_list_version
+pick_list = pick_list_version.pick_list
+work_orders_by_site = pick_list_version.work_orders_by_site
+rows_by_work_order = pick_list_version.rows_by_work_order
+work_order_search = pick_list_version.search
+rollups_by_site = pick_list_version.rollups_by_site
+
+# Pick ticket PDFs by pick-list version and work order. The least recently used tickets are evicted once
+# max_entries is reached. The rows come from the session's own version and are not hashed: the version ID
+# keys them, so a ticket is never rendered from another version than the one it is cached under.
+@st.cache_resource(max_entries=256, show_spinner="Rendering PDF...")
+def pick_ticket_pdf(version, site_id, work_order_id, site_text, _rows):
+    return generate_pdf(site_text, work_order_id, _rows)
+
+# Zip of every pick ticket for a site and scheduled-date window, rendered across a process pool. The server
+# runs sessions and the watcher on threads, and forking a multi-threaded process can deadlock the child, so
+# the workers are started from a fork server instead. Like the tickets, it renders the session's own version
+# of the pick list, keyed by its ID.
+@st.cache_resource(max_entries=8, show_spinner="Rendering pick tickets...")
+def shift_pick_tickets(version, site_id, start, end, _pick_list):
+    return render_batch(_pick_list, site_id, start, end, mp_context=multiprocessing.get_context("forkserver"))
 
 # Custom CSS for a modern, elegant theme
 st.markdown(
@@ -88,16 +120,20 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-site_texts = {
-    "1": "Boulder",
-    "2": "Hamlin",
-    "5": "CMF",
-}
-
 st.title("KBI Biopharma")
 st.markdown("<p class='title'>Production Pick List</p>", unsafe_allow_html=True)
 
+# Version in use, checked every few seconds; once the watcher has loaded a newer one the app reruns on it
+@st.fragment(run_every=10)
+def pick_list_version_caption():
+    shown = st.session_state['pick_list_version']
+    if watcher.current.version != shown.version:
+        st.rerun()
+    st.caption(f"Pick list version {shown.version} · generated {shown.generated:%Y-%m-%d %H:%M}")
+
 # Sidebar inputs
+with st.sidebar:
+    pick_list_version_caption()
 st.sidebar.header("🔎 Work Order Search")
 site_id = st.sidebar.text_input("Enter Site ID:")
 
@@ -110,23 +146,42 @@ if 'site_id' in st.session_state:
     site_text = site_texts.get(site_id, "KBI Biopharma")
     st.sidebar.subheader(f"📍 {site_text}")
 
-    pick_list['Target Site ID'] = pick_list['Target Site ID'].astype(str)
-
-    if site_id_selected in pick_list['Target Site ID'].values:
-        filtered_work_orders = pick_list[pick_list['Target Site ID'] == site_id_selected]
-
-        if not filtered_work_orders.empty:
-            work_order_options = filtered_work_orders['Work Order ID'].astype(str).unique()
-            work_order_id = st.sidebar.selectbox("Select Work Order ID:", options=work_order_options)
-        else:
-            st.sidebar.warning(f"No work orders found for site ID {site_id_selected}.")
+    work_order_id = None
+    if site_id_selected in work_orders_by_site:
+        # Only the top matches are offered, from the prebuilt index
+        search_text = st.sidebar.text_input("Search Work Orders:", help="Work Order, Project, Batch, Production or Item ID")
+        search_dates = st.sidebar.date_input("Scheduled Between:", value=())
+        search_start, search_end = search_dates if len(search_dates) == 2 else (None, None)
+        work_order_options = [work_order for _, work_order in
+                              work_order_search.search(search_text, site_id_selected, search_start, search_end)]
+        work_order_id = st.sidebar.selectbox("Select Work Order ID:", options=work_order_options,
+                                             format_func=lambda work_order: work_order_search.label((site_id_selected, work_order)))
+        if not work_order_options:
+            st.sidebar.info("No work orders match the search.")
+
+        # Every pick ticket for the site over a scheduled-date window, e.g. for shift start
+        with st.sidebar.expander("🖨 Shift Pick Tickets"):
+            shift_dates = st.date_input("Scheduled Dates:", value=(datetime.today().date(), datetime.today().date()))
+            if st.button("Render Pick Tickets", key="render_shift") and len(shift_dates) == 2:
+                archive, ticket_count = shift_pick_tickets(pick_list_version.version, site_id_selected, shift_dates[0],
+                                                           shift_dates[1], pick_list)
+                st.download_button(f"Download {ticket_count} Pick Tickets", archive, file_name=f"Pick Tickets {site_id_selected} {shift_dates[0]}.zip", mime="application/zip")
     else:
         st.sidebar.warning(f"Site ID {site_id_selected} does not exist in the work orders.")
 
+    # Site-wide allocation status and shortages by scheduled date, precomputed by the generator
+    if site_id_selected in rollups_by_site:
+        site_status, site_shortages = rollups_by_site[site_id_selected]
+        with st.expander(f"📊 Site Overview: {site_text}"):
+            st.bar_chart(site_status, x="Scheduled Date", y=["Fully Allocated", "Partially Allocated", "Not Allocated"])
+            st.dataframe(site_status, hide_index=True)
+            st.subheader("Shortages by Item")
+            st.dataframe(site_shortages, hide_index=True)
+
     if work_order_id:
-        filtered_pick_list = pick_list[pick_list['Work Order ID'].astype(str) == work_order_id]
+        filtered_pick_list = rows_by_work_order.get((site_id_selected, work_order_id))
 
-        if not filtered_pick_list.empty:
+        if filtered_pick_list is not None:
             st.subheader(f"📋 Work Order ID: {work_order_id}")
 
             # Metric Display
@@ -136,7 +191,7 @@ if 'site_id' in st.session_state:
             col3.metric("🔢 Batch", filtered_pick_list.iloc[0]['Batch ID'])
 
             col4, col5, col6 = st.columns(3)
-            sched_datetime = pd.to_datetime(filtered_work_orders.iloc[0]['Scheduled Date'])
+            sched_datetime = pd.to_datetime(filtered_pick_list.iloc[0]['Scheduled Date'])
             sched_date_str = sched_datetime.strftime('%Y-%m-%d')
             col4.metric("📅 Scheduled Date", sched_date_str)
             col5.metric("📝 Custom Data", filtered_pick_list.iloc[0]['Custom Data'])
@@ -148,171 +203,11 @@ if 'site_id' in st.session_state:
                                'Lot Qty to Pick', 'Lot ID', 'Expiration Date', 'Stock UoM', 'Item Description']
             st.dataframe(filtered_pick_list[display_columns])
 
-            def generate_pdf():
-                pdf = FPDF()
-                # Add a Unicode font (DejaVu)
-                pdf.add_font('DejaVu', '', '/workspaces/picklistapp/DejaVuSans.ttf', uni=True)
-                pdf.add_font('DejaVu', 'B', '/workspaces/picklistapp/DejaVuSans-Bold.ttf', uni=True)
-                pdf.set_font('DejaVu', '', 10)
-
-                pdf.set_auto_page_break(auto=True, margin=15)
-                pdf.add_page()
-
-                # Main Title Section
-                pdf.set_font("Arial", 'B', 14)
-                
-                pdf.cell(0, 12, f"KBI Biopharma - {site_text}", ln=True, align='C', fill=False, border=1)
-
-                # Title Section
-                pdf.set_font("Arial", 'B', 12)
-                pdf.set_fill_color(235, 235, 235)  # Light blue background
-                pdf.cell(0, 12, f"Work Order ID: {work_order_id}", ln=True, align='C', fill=True, border = 1)
-                pdf.ln(8)
-
-                # Work Order Information - Two Column Layout
-                pdf.set_font("DejaVu", size=10)
-                
-                # Left Column
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "Project ID:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Project Number']}", border=0)
-                
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "Production Item ID:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Production ID']}", ln=True)
-
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "Batch:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Batch ID']}", border=0)
-
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "Scheduled Date:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Scheduled Date']}", ln=True)
-
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "Custom Data:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['Custom Data']}", ln=True)
-
-                pdf.set_font("Arial", style='B', size=10)
-                pdf.cell(45, 8, "BoM Custom Data:", border=0)
-                pdf.set_font("DejaVu", size=10)
-                pdf.cell(50, 8, f"{filtered_pick_list.iloc[0]['BoM Custom Data']}", ln=True)
-
-                pdf.ln(10)
-
-                # Pick List Header
-                pdf.set_font("Arial", 'B', 12)
-                pdf.cell(0, 10, "Pick List", ln=True, align='C', fill=True, border=1)
-                pdf.ln(4)
-
-                # Table Formatting
-                pdf.set_font("DejaVu", 'B', 10)
-
-                # Group rows by ITEM_ID
-                grouped_data = defaultdict(list)
-                for _, row in filtered_pick_list.iterrows():
-                    item_id = row["Item ID"]
-                    grouped_data[item_id].append(row)
-
-                # Start processing each item group
-                for item_id, item_rows in grouped_data.items():
-                    # Extract item-specific details for the header
-                    total_qty_to_pick = str(item_rows[0]["Total Qty to Pick"])
-                    stock_uom = str(item_rows[0]["Stock UoM"])
-                    item_description = str(item_rows[0]["Item Description"])
-                    item_orig_status = str(item_rows[0]['Original/Substitute'])
-                    allocation_status = str(item_rows[-1]["Allocation Status"])
-
-                    # Display the item-specific details as headers, each on a new line
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"Item ID: ", border=0, ln=False)  # Set width and avoid line break
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{item_id}", ln=False)  # Add line break after value
-                    pdf.ln(5)
-
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"O/S: ", border=0, ln=False)
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{item_orig_status}", ln=False)  # Add line break after value
-                    pdf.ln(5)
-
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"Total Qty to Pick: ", border=0, ln=False)
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{total_qty_to_pick}", ln=False)  # Add line break after value
-                    pdf.ln(5)
-
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"Stock UoM: ", border=0, ln=False)
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{stock_uom}", ln=False)  # Add line break after value
-                    pdf.ln(5)
-
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"Item Description: ", border=0, ln=False)
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{item_description}", ln=False)  # Add line break after value
-                    pdf.ln(5)
-
-                    pdf.set_font("Arial", 'B', 10)  # Set bold for the name
-                    pdf.cell(40, 10, f"Allocation Status: ", border=0, ln=False)
-                    pdf.set_font("DejaVu", '', 10)  # Set normal for the value
-                    pdf.cell(0, 10, f"{allocation_status}", ln=False)  # Add line break after value
-                    pdf.ln(5)                       
-
-                    pdf.ln(6)
-
-
-                    # Create the sub-table headers (with two columns)
-                    sub_table_headers = ["Location ID", "Lot Qty to Pick", "Lot ID", "Expiration Date"]
-                    col_widths_sub = [15, 25, 25, 20]
-
-                    # Print Sub-table Header (for location, lot qty, lot ID, expiration date) in two columns
-                    pdf.set_font("Arial", '', 10)
-                    pdf.cell(col_widths_sub[0] * 2, 10, sub_table_headers[0], border=1, align='C', fill=True)
-                    pdf.cell(col_widths_sub[1] * 2, 10, sub_table_headers[1], border=1, align='C', fill=True)
-                    pdf.cell(col_widths_sub[2] * 2, 10, sub_table_headers[2], border=1, align='C', fill=True)
-                    pdf.cell(col_widths_sub[3] * 2, 10, sub_table_headers[3], border=1, align='C', fill=True)
-                    pdf.ln(10)  # Move to the next row after headers
-
-                    # Print each row in the sub-table for the current item
-                    pdf.set_font("Arial", size=9)
-                    for row in item_rows:
-                        loc_id = str(row["Location ID"])
-                        lot_qty_to_pick = str(row["Lot Qty to Pick"])
-                        lotid = str(row["Lot ID"])
-                        expiration_date = row["Expiration Date"]
-
-                        # Print the data in the sub-table
-                        pdf.cell(col_widths_sub[0] * 2, 10, loc_id, border=1, align='C')
-                        pdf.cell(col_widths_sub[1] * 2, 10, lot_qty_to_pick, border=1, align='C')
-                        pdf.cell(col_widths_sub[2] * 2, 10, lotid, border=1, align='C')
-                        pdf.cell(col_widths_sub[3] * 2, 10, expiration_date, border=1, align='C')
-                        pdf.ln(10)  # Move to the next row after this entry
-
-                        # Ensure there's no overlap, check the Y position and add a page if needed
-                        if pdf.get_y() > pdf.h - 40:  # 40 is a margin for the page bottom
-                            pdf.add_page()
-
-                    pdf.ln(10)  # Add some space between different items
-
-
-
-                # Save the file
-                pdf_file = f"WO_{work_order_id}.pdf"
-                pdf.output(pdf_file)
-                return pdf_file
-
             # Styled Download Button
             if st.button("Download PDF", key="download", help="Download the pick list as a PDF"):
-                pdf_file = generate_pdf()
-                with open(pdf_file, "rb") as f:
-                    st.download_button("Click to Download", f, file_name=pdf_file, mime="application/pdf", use_container_width=True)
+                pdf_bytes = pick_ticket_pdf(pick_list_version.version, site_id_selected, work_order_id, site_text,
+                                            filtered_pick_list)
+                st.download_button("Click to Download", pdf_bytes, file_name=f"WO_{work_order_id}.pdf", mime="application/pdf", use_container_width=True)
         else:
             st.warning("⚠️ No pick list data found for this Work Order ID.")
     else:
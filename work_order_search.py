@@ -0,0 +1,80 @@
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+
+# Work order fields the navigator searches, and the pick row field searched across a work order's picks
+search_fields = ["Work Order ID", "Project Number", "Batch ID", "Production ID"]
+pick_search_field = "Item ID"
+
+# Search index over a pick list's work orders, built once per pick-list version. Every field value is a term,
+# lowercased: terms are kept sorted for prefix lookups by bisection and joined into one newline-separated
+# string for substring lookups by a single regex scan. `search` ranks exact term matches first, then prefix
+# and then substring matches, earliest scheduled first, and returns only the top matches.
+class WorkOrderSearch:
+    def __init__(self, pick_list):
+        work_orders = pick_list.drop_duplicates(["Target Site ID", "Work Order ID"])
+        self.keys = list(zip(work_orders["Target Site ID"].tolist(), work_orders["Work Order ID"].tolist()))
+        self.sites = work_orders["Target Site ID"].to_numpy(dtype=object)
+        self.sched_dates = pd.to_datetime(work_orders["Scheduled Date"]).dt.normalize().to_numpy()
+        self.labels = [
+            f"{work_order_id} · {project} · {batch} · {'' if pd.isna(sched) else sched.strftime('%Y-%m-%d')}"
+            for work_order_id, project, batch, sched in zip(
+                work_orders["Work Order ID"].tolist(), work_orders["Project Number"].tolist(),
+                work_orders["Batch ID"].tolist(), pd.to_datetime(work_orders["Scheduled Date"]).tolist())
+        ]
+
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        terms = set()
+        for field in search_fields:
+            for row, value in enumerate(work_orders[field].tolist()):
+                if not pd.isna(value):
+                    terms.add((str(value).lower(), row))
+        for site_id, work_order_id, value in zip(pick_list["Target Site ID"].tolist(), pick_list["Work Order ID"].tolist(),
+                                                 pick_list[pick_search_field].tolist()):
+            if not pd.isna(value):
+                terms.add((str(value).lower(), self.rows[(site_id, work_order_id)]))
+        terms = sorted(terms)
+
+        self.terms = [term for term, _ in terms]
+        self.term_rows = np.array([row for _, row in terms], dtype=np.int64)
+        self.text = "\n".join(self.terms)
+        self.term_starts = np.cumsum([0] + [len(term) + 1 for term in self.terms[:-1]])
+
+    # Work order ID, project, batch and scheduled date of a (site, work order) key, for display
+    def label(self, key):
+        return self.labels[self.rows[key]]
+
+    # Rank of each work order for query: 0 exact term match, 1 prefix, 2 substring, 3 no match.
+    # Single characters only match as prefixes, since nearly every term contains one.
+    def ranks(self, query):
+        ranks = np.full(len(self.keys), 3, dtype=np.int8)
+        if not query:
+            ranks[:] = 0
+            return ranks
+
+        first, end = bisect.bisect_left(self.terms, query), bisect.bisect_left(self.terms, query + "\uffff")
+        np.minimum.at(ranks, self.term_rows[first:end], 1)
+        np.minimum.at(ranks, self.term_rows[first:bisect.bisect_right(self.terms, query, first, end)], 0)
+
+        if len(query) > 1:
+            positions = [match.start() for match in re.finditer(re.escape(query), self.text)]
+            terms = np.searchsorted(self.term_starts, positions, side='right') - 1
+            np.minimum.at(ranks, self.term_rows[terms], 2)
+        return ranks
+
+    # Top limit (site, work order) keys matching query on site_id, scheduled between start and end inclusive
+    def search(self, query, site_id=None, start=None, end=None, limit=25):
+        ranks = self.ranks(query.strip().lower())
+        mask = ranks < 3
+        if site_id is not None:
+            mask &= self.sites == str(site_id)
+        if start is not None:
+            mask &= self.sched_dates >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            mask &= self.sched_dates <= np.datetime64(pd.Timestamp(end))
+
+        rows = np.flatnonzero(mask)
+        order = np.lexsort((self.sched_dates[rows], ranks[rows]))[:limit]
+        return [self.keys[row] for row in rows[order]]